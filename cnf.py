@@ -0,0 +1,545 @@
+'''
+Pure Boolean backend which builds constraints straight into CNF.
+
+CNFSolver implements the subset of the smt_switch solver interface used by
+the constraint generators.  All terms are single literals: 1-bit bit-vectors
+and Bools are identified and wider bit-vectors are not supported, so the
+one-hot constraints need a non 'bv' encoding and popcounts need a unary
+counter (see optimization.init_popcount_unary).
+
+Gates are structurally hashed and their Tseitin clauses are only emitted
+once a gate is referenced by a clause, so constraints of the form
+And(...) or Or(...) asserted at the top level become plain clauses.
+
+With the option 'external-solver' set to a command line, checks write the
+problem to a file (DIMACS, or SMT-LIB2 if 'external-format' is 'smt2'),
+run the command on it with 'external-timeout' seconds and read the model
+back from its output.
+'''
+import itertools as it
+import os
+import re
+import shlex
+import subprocess
+import tempfile
+import typing as tp
+
+try:
+    from pysat.solvers import Solver as _SATSolver
+    from pysat.formula import WCNF as _WCNF
+    from pysat.examples.rc2 import RC2 as _RC2
+except ImportError:
+    _SATSolver = None
+
+Lit = int
+Clause = tp.List[Lit]
+
+_TRUE = 1
+_FALSE = -1
+
+class CNFSort:
+    def __init__(self, name : str, width : int):
+        self.name = name
+        self.width = width
+
+    def __repr__(self) -> str:
+        return self.name
+
+class CNFTerm:
+    '''
+        A literal in a CNFSolver, supports the operators the constraint
+        generators use on 1-bit bit-vectors
+    '''
+    __slots__ = ('_solver', '_lit', 'sort')
+
+    def __init__(self, solver : 'CNFSolver', lit : Lit, sort : CNFSort):
+        self._solver = solver
+        self._lit = lit
+        self.sort = sort
+
+    @property
+    def lit(self) -> Lit:
+        return self._lit
+
+    def _coerce(self, other) -> Lit:
+        if isinstance(other, CNFTerm):
+            return other._lit
+        elif other in (0, 1):
+            return _TRUE if other else _FALSE
+        raise TypeError(f'Cannot use {other!r} as a 1-bit term')
+
+    def _wrap(self, lit : Lit) -> 'CNFTerm':
+        return CNFTerm(self._solver, lit, self.sort)
+
+    def __and__(self, other) -> 'CNFTerm':
+        return self._wrap(self._solver._and((self._lit, self._coerce(other))))
+
+    def __or__(self, other) -> 'CNFTerm':
+        return self._wrap(-self._solver._and((-self._lit, -self._coerce(other))))
+
+    def __xor__(self, other) -> 'CNFTerm':
+        return self._wrap(self._solver._xor(self._lit, self._coerce(other)))
+
+    __rand__ = __and__
+    __ror__ = __or__
+    __rxor__ = __xor__
+
+    def __invert__(self) -> 'CNFTerm':
+        return self._wrap(-self._lit)
+
+    def __eq__(self, other) -> 'CNFTerm':
+        return self._wrap(-self._solver._xor(self._lit, self._coerce(other)))
+
+    def __ne__(self, other) -> 'CNFTerm':
+        return self._wrap(self._solver._xor(self._lit, self._coerce(other)))
+
+    def __getitem__(self, idx : int) -> 'CNFTerm':
+        if idx != 0:
+            raise IndexError(idx)
+        return self
+
+    def __hash__(self) -> int:
+        return hash(self._lit)
+
+    def __repr__(self) -> str:
+        return f'<CNFTerm : {self._lit}>'
+
+class _Value:
+    __slots__ = ('_v',)
+    def __init__(self, v : int):
+        self._v = v
+
+    def as_int(self) -> int:
+        return self._v
+
+    def as_bool(self) -> bool:
+        return bool(self._v)
+
+class CNFSolver:
+    solver_name = 'CNF'
+    default_sat_solver = 'cadical153'
+
+    def __init__(self):
+        self._options = dict()
+        self.Reset()
+
+    def Reset(self) -> None:
+        if getattr(self, '_sat', None) is not None:
+            self._sat.delete()
+        self._nvars = 1 # var 1 is the constant true
+        self._clauses = [[_TRUE]]
+        self._fed = 0
+        self._gates = dict()
+        self._defs = dict()
+        self._emitted = set()
+        self._names = dict()
+        self._frames = []
+        self._sat = None
+        self._model = None
+        self._core = None
+        self._assumptions = ()
+
+    # ---- smt_switch interface ----
+    def SetLogic(self, logic : str) -> None:
+        pass
+
+    def SetOption(self, opt : str, value) -> None:
+        self._options[opt] = value
+
+    def Bool(self) -> CNFSort:
+        return _BOOL
+
+    def BitVec(self, width : int) -> CNFSort:
+        if width != 1:
+            raise TypeError(f'CNF backend only supports 1-bit vectors (got BitVec({width})), '
+                'use a non bv one-hot encoding')
+        return _BV1
+
+    def DeclareConst(self, name : str, sort : CNFSort) -> CNFTerm:
+        if sort.width != 1:
+            raise TypeError(f'CNF backend only supports 1-bit vectors')
+        t = CNFTerm(self, self._new_var(), sort)
+        self._names[name] = t
+        return t
+
+    def TheoryConst(self, sort : CNFSort, value) -> CNFTerm:
+        return CNFTerm(self, _TRUE if value else _FALSE, sort)
+
+    def And(self, *args) -> CNFTerm:
+        return CNFTerm(self, self._and(self._lits(args)), _BOOL)
+
+    def Or(self, *args) -> CNFTerm:
+        return CNFTerm(self, -self._and([-l for l in self._lits(args)]), _BOOL)
+
+    def Not(self, a : CNFTerm) -> CNFTerm:
+        return ~a
+
+    def Implies(self, a : CNFTerm, b : CNFTerm) -> CNFTerm:
+        return self.Or(~a, b)
+
+    def Xor(self, a : CNFTerm, b : CNFTerm) -> CNFTerm:
+        return a ^ b
+
+    def Equals(self, a : CNFTerm, b : CNFTerm) -> CNFTerm:
+        return a == b
+
+    def BVAnd(self, a : CNFTerm, b : CNFTerm) -> CNFTerm:
+        return a & b
+
+    def BVOr(self, a : CNFTerm, b : CNFTerm) -> CNFTerm:
+        return a | b
+
+    def BVXor(self, a : CNFTerm, b : CNFTerm) -> CNFTerm:
+        return a ^ b
+
+    def BVNot(self, a : CNFTerm) -> CNFTerm:
+        return ~a
+
+    def Ite(self, c : CNFTerm, a : CNFTerm, b : CNFTerm) -> CNFTerm:
+        c, a, b = c.lit, a.lit, b.lit
+        lit = -self._and((-self._and((c, a)), -self._and((-c, b))))
+        return CNFTerm(self, lit, _BV1)
+
+    def Assert(self, t) -> None:
+        if isinstance(t, bool):
+            if not t:
+                self._add_clause([_FALSE])
+            return
+
+        stack = [t.lit]
+        while stack:
+            lit = stack.pop()
+            d = self._defs.get(lit)
+            if d is not None and d[0] == 'and':
+                stack.extend(d[1])
+                continue
+            d = self._defs.get(-lit)
+            if d is not None and d[0] == 'and':
+                self._add_clause([-l for l in d[1]])
+            else:
+                self._add_clause([lit])
+
+    def Push(self) -> None:
+        self._frames.append(self._new_var())
+
+    def Pop(self) -> None:
+        sel = self._frames.pop()
+        self._clauses.append([-sel])
+
+    def CheckSat(self) -> bool:
+        return self.CheckSatAssuming(())
+
+    def CheckSatAssuming(self, assumptions : tp.Iterable[CNFTerm]) -> bool:
+        assumptions = tuple(assumptions)
+        lits = [*self._frames, *(a.lit for a in assumptions)]
+        for l in lits:
+            self._ensure(abs(l))
+        self._model = None
+        self._core = None
+        self._assumptions = assumptions
+        if self._options.get('external-solver'):
+            return self._check_external([a.lit for a in assumptions])
+
+        solver = self._sat_solver()
+        self._feed()
+        if solver.solve(assumptions=lits):
+            model = bytearray(self._nvars + 1)
+            for l in solver.get_model():
+                if l > 0:
+                    model[l] = 1
+            self._model = model
+            return True
+        else:
+            self._core = set(solver.get_core() or ())
+            return False
+
+    def Minimize(self, soft : tp.Sequence[CNFTerm]) -> tp.Optional[int]:
+        '''
+            find a model of the asserted clauses which sets as few of soft
+            as possible using the RC2 MaxSAT solver.
+            returns the number of soft terms set or None if unsat
+        '''
+        if _SATSolver is None:
+            raise ImportError('The CNF backend requires pysat (pip install python-sat)')
+        for t in soft:
+            self._ensure(abs(t.lit))
+
+        wcnf = _WCNF()
+        wcnf.extend(self.hard_clauses())
+        for t in soft:
+            wcnf.append([-t.lit], weight=1)
+
+        self._model = None
+        self._core = None
+        name = self._options.get('maxsat-solver', 'cd15')
+        # core exhaustion and minimization pay off on the routing problems
+        with _RC2(wcnf, solver=name, adapt=True, exhaust=True, minz=True) as rc2:
+            m = rc2.compute()
+            if m is None:
+                return None
+            model = bytearray(self._nvars + 1)
+            for l in m:
+                if l > 0:
+                    model[l] = 1
+            self._model = model
+            return rc2.cost
+
+    def GetUnsatAssumptions(self) -> tp.List[CNFTerm]:
+        assert self._core is not None
+        return [a for a in self._assumptions if a.lit in self._core]
+
+    def GetValue(self, t : CNFTerm) -> _Value:
+        assert self._model is not None
+        return _Value(int(self._eval(t.lit)))
+
+    def GetValues(self, ts : tp.Iterable[CNFTerm]) -> tp.List[int]:
+        assert self._model is not None
+        return [int(self._eval(t.lit)) for t in ts]
+
+    # ---- CNF access ----
+    @property
+    def num_vars(self) -> int:
+        return self._nvars
+
+    @property
+    def names(self) -> tp.Mapping[str, CNFTerm]:
+        return self._names
+
+    def clauses(self) -> tp.Iterator[Clause]:
+        ''' the clauses asserted so far, push frames are not active '''
+        return iter(self._clauses)
+
+    def hard_clauses(self) -> tp.List[Clause]:
+        ''' the clauses asserted so far with the current push frames applied '''
+        return [*self._clauses, *([sel] for sel in self._frames)]
+
+    def literal(self, lit : Lit) -> CNFTerm:
+        ''' term of an existing variable, e.g. one read with read_dimacs '''
+        assert 0 < abs(lit) <= self._nvars
+        return CNFTerm(self, lit, _BV1)
+
+    def _problem(self, assumptions : tp.Sequence[Lit]) -> tp.List[Clause]:
+        for l in assumptions:
+            self._ensure(abs(l))
+        return [*self.hard_clauses(), *([l] for l in assumptions)]
+
+    def write_dimacs(self, f : tp.TextIO, assumptions : tp.Sequence[Lit] = ()) -> None:
+        ''' write the current problem, push frames and assumptions become unit clauses '''
+        clauses = self._problem(assumptions)
+        f.write(f'p cnf {self._nvars} {len(clauses)}\n')
+        for clause in clauses:
+            f.write(' '.join(map(str, clause)))
+            f.write(' 0\n')
+
+    def write_smtlib2(self, f : tp.TextIO, assumptions : tp.Sequence[Lit] = ()) -> None:
+        ''' write the current problem as SMT-LIB2 which asks for the value of every variable '''
+        def lit(l):
+            return f'x{l}' if l > 0 else f'(not x{-l})'
+        f.write('(set-logic QF_UF)\n')
+        for v in range(1, self._nvars + 1):
+            f.write(f'(declare-const x{v} Bool)\n')
+        for clause in self._problem(assumptions):
+            if len(clause) == 1:
+                f.write(f'(assert {lit(clause[0])})\n')
+            else:
+                f.write(f'(assert (or {" ".join(map(lit, clause))}))\n')
+        f.write('(check-sat)\n')
+        f.write(f'(get-value ({" ".join(f"x{v}" for v in range(1, self._nvars + 1))}))\n')
+        f.write('(exit)\n')
+
+    def read_dimacs(self, f : tp.TextIO) -> None:
+        ''' assert the clauses of a DIMACS file, variables keep their numbers '''
+        if self._nvars != 1 or len(self._clauses) != 1:
+            raise ValueError('read_dimacs requires a freshly reset solver')
+        clause = []
+        for line in f:
+            if line.startswith('c'):
+                continue
+            elif line.startswith('p'):
+                _, _, nvars, _ = line.split()
+                self._nvars = max(self._nvars, int(nvars))
+                continue
+            for l in map(int, line.split()):
+                if l == 0:
+                    self._clauses.append(clause)
+                    clause = []
+                else:
+                    clause.append(l)
+        assert not clause, 'unterminated clause'
+
+    # ---- internals ----
+    def _new_var(self) -> Lit:
+        self._nvars += 1
+        return self._nvars
+
+    def _lits(self, args) -> tp.List[Lit]:
+        if len(args) == 1 and not isinstance(args[0], (CNFTerm, bool)):
+            args = args[0]
+        lits = []
+        for a in args:
+            if isinstance(a, bool):
+                lits.append(_TRUE if a else _FALSE)
+            else:
+                lits.append(a.lit)
+        return lits
+
+    def _and(self, lits : tp.Iterable[Lit]) -> Lit:
+        s = set()
+        for l in lits:
+            d = self._defs.get(l)
+            if d is not None and d[0] == 'and' and len(d[1]) <= 8:
+                # flatten small conjunctions, cuts gates in reduce chains
+                s.update(d[1])
+            else:
+                s.add(l)
+        s.discard(_TRUE)
+        if _FALSE in s or any(-l in s for l in s):
+            return _FALSE
+        elif not s:
+            return _TRUE
+        elif len(s) == 1:
+            return next(iter(s))
+
+        key = 'and', frozenset(s)
+        if key not in self._gates:
+            v = self._new_var()
+            self._gates[key] = v
+            self._defs[v] = 'and', tuple(s)
+        return self._gates[key]
+
+    def _xor(self, a : Lit, b : Lit) -> Lit:
+        if abs(a) == _TRUE:
+            return -b if a == _TRUE else b
+        elif abs(b) == _TRUE:
+            return -a if b == _TRUE else a
+        elif a == b:
+            return _FALSE
+        elif a == -b:
+            return _TRUE
+
+        sign = 1
+        if a < 0:
+            a, sign = -a, -sign
+        if b < 0:
+            b, sign = -b, -sign
+        key = 'xor', min(a, b), max(a, b)
+        if key not in self._gates:
+            v = self._new_var()
+            self._gates[key] = v
+            self._defs[v] = key
+        return sign*self._gates[key]
+
+    def _ensure(self, var : Lit) -> None:
+        ''' emit the definitions of var and every gate it depends on '''
+        stack = [var]
+        clauses = self._clauses
+        while stack:
+            v = stack.pop()
+            if v in self._emitted or v not in self._defs:
+                continue
+            self._emitted.add(v)
+            d = self._defs[v]
+            if d[0] == 'and':
+                ls = d[1]
+                for l in ls:
+                    clauses.append([-v, l])
+                clauses.append([v, *(-l for l in ls)])
+                stack.extend(abs(l) for l in ls)
+            else:
+                _, a, b = d
+                clauses.append([-v, a, b])
+                clauses.append([-v, -a, -b])
+                clauses.append([v, -a, b])
+                clauses.append([v, a, -b])
+                stack.append(a)
+                stack.append(b)
+
+    def _add_clause(self, clause : Clause) -> None:
+        if _TRUE in clause:
+            return
+        clause = [l for l in clause if l != _FALSE] or [_FALSE]
+        for l in clause:
+            self._ensure(abs(l))
+        if self._frames:
+            clause.append(-self._frames[-1])
+        self._clauses.append(clause)
+
+    def _check_external(self, assumptions : tp.Sequence[Lit]) -> bool:
+        command = shlex.split(self._options['external-solver'])
+        smt2 = self._options.get('external-format', 'dimacs') == 'smt2'
+        timeout = self._options.get('external-timeout')
+        if timeout is not None:
+            timeout = float(timeout)
+
+        fd, path = tempfile.mkstemp(suffix='.smt2' if smt2 else '.cnf')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                if smt2:
+                    self.write_smtlib2(f, assumptions)
+                else:
+                    self.write_dimacs(f, assumptions)
+            try:
+                out = subprocess.run([*command, path], stdout=subprocess.PIPE,
+                        universal_newlines=True, timeout=timeout).stdout
+            except subprocess.TimeoutExpired:
+                raise TimeoutError(f'{command[0]} timed out after {timeout} seconds') from None
+        finally:
+            os.remove(path)
+
+        if smt2:
+            status = out.split(None, 1)[0] if out.strip() else 'unknown'
+            sat = {'sat' : True, 'unsat' : False}.get(status)
+            true = (int(v) for v, b in re.findall(r'\(\s*x(\d+)\s+(true|false)\s*\)', out) if b == 'true')
+        else:
+            status = re.search(r'^s\s+(\S+)', out, re.M)
+            sat = {'SATISFIABLE' : True, 'UNSATISFIABLE' : False}.get(status and status.group(1))
+            true = (int(l) for line in re.findall(r'^v(.*)$', out, re.M) for l in line.split() if int(l) > 0)
+        if sat is None:
+            raise RuntimeError(f'{command[0]} did not decide the problem:\n{out}')
+
+        if sat:
+            model = bytearray(self._nvars + 1)
+            for v in true:
+                if v <= self._nvars:
+                    model[v] = 1
+            self._model = model
+        else:
+            # external solvers give no core, every assumption is blamed
+            self._core = set(assumptions)
+        return sat
+
+    def _sat_solver(self):
+        if self._sat is None:
+            if _SATSolver is None:
+                raise ImportError('The CNF backend requires pysat (pip install python-sat)')
+            name = self._options.get('sat-solver', self.default_sat_solver)
+            self._sat = _SATSolver(name=name)
+            self._fed = 0
+        return self._sat
+
+    def _feed(self) -> None:
+        solver = self._sat
+        for clause in it.islice(self._clauses, self._fed, None):
+            solver.add_clause(clause)
+        self._fed = len(self._clauses)
+
+    def _eval(self, lit : Lit) -> bool:
+        model = self._model
+        var = abs(lit)
+        if var < len(model) and (var in self._emitted or var not in self._defs):
+            v = bool(model[var])
+        else:
+            v = self._eval_gate(var)
+        return v if lit > 0 else not v
+
+    def _eval_gate(self, var : Lit) -> bool:
+        d = self._defs.get(var)
+        if d is None:
+            return False
+        elif d[0] == 'and':
+            return all(self._eval(l) for l in d[1])
+        else:
+            return self._eval(d[1]) != self._eval(d[2])
+
+_BOOL = CNFSort('Bool', 1)
+_BV1 = CNFSort('BitVec(1)', 1)
@@ -1,20 +1,49 @@
 import typing as tp
+import itertools as it
 import mrrg
 import design
 import functools as ft
 from mrrg import MRRG
-from design import Design
-from modeler import Modeler
+from design import Design, Operation, Value
+from modeler import Modeler, SWAP
+import symmetry
 from smt_switch_types import Solver, Term, Sort
+from util import AutoPartial
 
 ConstraintGeneratorType = tp.Callable[[MRRG, Design, Modeler, Solver], Term]
 
+def _can_swap(pe : mrrg.FunctionalUnit, op : design.Operation) -> bool:
+    return op.commute and op.opcode in pe.ops and 0 in pe.operands and 1 in pe.operands
+
 def init_placement_vars(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
     bv1 = solver.BitVec(1)
     for pe in cgra.functional_units:
         for op in design.operations:
             vars.init_var((pe, op), bv1)
-    return solver.TheoryConst(solver.Bool(), True)
+            if _can_swap(pe, op):
+                vars.init_var((pe, op, SWAP), bv1)
+    return vars.terms.bool_const(True)
+
+def init_placement_vars_sparse(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+    '''
+        only declare placement vars for (pe, op) pairs where pe supports op,
+        all other pairs are treated as constant 0 by the constraint generators
+    '''
+    bv1 = solver.BitVec(1)
+    for op in design.operations:
+        for pe in cgra.legal_units(op.opcode):
+            vars.init_var((pe, op), bv1)
+            if _can_swap(pe, op):
+                vars.init_var((pe, op, SWAP), bv1)
+    return vars.terms.bool_const(True)
+
+def _op_vars(cgra : MRRG, op : design.Operation, vars : Modeler) -> tp.List[Term]:
+    ''' placement vars of all pes which may hold op '''
+    return [vars[pe, op] for pe in cgra.legal_units(op.opcode) if (pe, op) in vars]
+
+def _pe_vars(pe : mrrg.FunctionalUnit, design : Design, vars : Modeler) -> tp.List[Term]:
+    ''' placement vars of all ops which may be placed on pe '''
+    return [vars[pe, op] for op in design.operations if op.opcode in pe.ops and (pe, op) in vars]
 
 def init_routing_vars(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
     bv1 = solver.BitVec(1)
@@ -23,39 +52,229 @@ def init_routing_vars(cgra : MRRG, design : Design, vars : Modeler, solver : Sol
             vars.init_var((node, value), bv1)
             for dst in value.dsts:
                 vars.init_var((node, value, dst), bv1)
-    return solver.TheoryConst(solver.Bool(), True)
+    return vars.terms.bool_const(True)
+
+def _operand_ports(pe : mrrg.FunctionalUnit, dst : tp.Tuple[design.Operation, int]) -> tp.List[mrrg.FU_Port]:
+    ''' ports of pe which may receive dst '''
+    op, operand = dst
+    if _can_swap(pe, op):
+        return [pe.operands[0], pe.operands[1]]
+    elif operand in pe.operands:
+        return [pe.operands[operand]]
+    return []
+
+def _routing_window(
+        cgra : MRRG,
+        value : design.Value,
+        dst : tp.Tuple[design.Operation, int],
+        slack : tp.Optional[int] = None) -> tp.FrozenSet[mrrg.Node]:
+    '''
+        nodes which can lie on a path from a source of value to dst,
+        if slack is not None only nodes on paths at most slack hops longer
+        than the shortest path are returned.
+
+        The window only depends on (src opcode, dst opcode, operand), not on
+        where the ops are placed: sources are all units supporting the src
+        opcode, sinks the operand ports of all units supporting the dst
+        opcode, and the budget is the single shortest path over all those
+        pairs + slack.  On homogeneous meshes some pair is always adjacent,
+        so the window grows quickly with slack.
+    '''
+    op, operand = dst
+    srcs = cgra.legal_units(value.src.opcode)
+    sinks = [port for pe in cgra.legal_units(op.opcode) for port in _operand_ports(pe, dst)]
+    if slack is None:
+        return mrrg.reachable(srcs) & mrrg.co_reachable(sinks)
+
+    d_src = mrrg.distances_from(srcs)
+    d_dst = mrrg.distances_to(sinks)
+    d = {n : d_src[n] + d_dst[n] for n in d_src.keys() & d_dst.keys()}
+    if not d:
+        return frozenset()
+    budget = min(d.values()) + slack
+    return frozenset(n for n, l in d.items() if l <= budget)
+
+def _init_routing_vars(
+        slack : tp.Optional[int],
+        cgra : MRRG,
+        design : Design,
+        vars : Modeler,
+        solver : Solver) -> Term:
+    bv1 = solver.BitVec(1)
+    windows = dict()
+    for value in design.values:
+        nodes = set()
+        for dst in value.dsts:
+            k = value.src.opcode, dst[0].opcode, dst[1], dst[0].commute
+            if k not in windows:
+                windows[k] = _routing_window(cgra, value, dst, slack)
+            for node in windows[k]:
+                vars.init_var((node, value, dst), bv1)
+            nodes |= windows[k]
+        for node in nodes:
+            vars.init_var((node, value), bv1)
+    return vars.terms.bool_const(True)
+
+def init_routing_vars_pruned(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+    '''
+        only declare routing vars for nodes which can lie on a path from an
+        fu which supports the source op to an fu which supports the
+        destination op, all other routing vars are treated as constant 0
+    '''
+    return _init_routing_vars(None, cgra, design, vars, solver)
+
+@AutoPartial(1)
+def init_routing_vars_window(
+        slack : tp.Optional[int],
+        cgra : MRRG,
+        design : Design,
+        vars : Modeler,
+        solver : Solver) -> Term:
+    '''
+        only declare routing vars for nodes on paths at most slack hops
+        longer than the shortest path from an fu which supports the source
+        op to an fu which supports the destination op.  Windows are per
+        (src opcode, dst opcode, operand), see _routing_window.
+        Restricts the solution space, slack=None is init_routing_vars_pruned.
+        Only sound when unsat widens the window, see PNR.solve_windowed.
+    '''
+    return _init_routing_vars(slack, cgra, design, vars, solver)
+
+def is_window(f : ConstraintGeneratorType) -> bool:
+    '''
+        whether f is init_routing_vars_window with a slack, which cuts off
+        feasible routes so an unsat result under it proves nothing
+    '''
+    return isinstance(f, ft.partial) and f.func is init_routing_vars_window.__wrapped__ \
+            and f.args[0] is not None
+
+def _zero(vars : Modeler) -> Term:
+    return vars.terms.bv_const(1, 0)
+
+def _is_one_hot_or_0(var : Term, vars : Modeler, solver : Solver):
+    return (var & (var - 1)) == vars.terms.bv_const(var.sort.width, 0)
+
+def _is_one_hot(var : Term, vars : Modeler, solver : Solver) -> Term:
+    return solver.And(_is_one_hot_or_0(var, vars, solver), var != vars.terms.bv_const(var.sort.width, 0))
+
+def _implies_not(a : Term, b : Term) -> Term:
+    ''' a -> !b '''
+    return (a & b) == 0
+
+def _implies(a : Term, b : Term) -> Term:
+    ''' a -> b '''
+    return (a & ~b) == 0
+
+def _amo_bv(xs : tp.Sequence[Term], vars : Modeler, solver : Solver) -> Term:
+    ''' pack xs into a bit-vector and check x & (x - 1) == 0 '''
+    x = vars.anonymous_var(solver.BitVec(len(xs)))
+    c = [x[idx] == v for idx, v in enumerate(xs)]
+    c.append(_is_one_hot_or_0(x, vars, solver))
+    return solver.And(c)
+
+def _amo_pairwise(xs : tp.Sequence[Term], vars : Modeler, solver : Solver) -> Term:
+    ''' no two of xs are set '''
+    return solver.And([_implies_not(a, b) for a, b in it.combinations(xs, 2)])
+
+def _amo_sequential(xs : tp.Sequence[Term], vars : Modeler, solver : Solver) -> Term:
+    '''
+        sequential counter (Sinz 2005), s[i] is set if any of xs[:i+1] is set
+    '''
+    bv1 = solver.BitVec(1)
+    n = len(xs)
+    s = [vars.anonymous_var(bv1) for _ in range(n - 1)]
+    c = [_implies(xs[0], s[0]), _implies_not(s[-1], xs[-1])]
+    for i in range(1, n - 1):
+        c.append(_implies(xs[i], s[i]))
+        c.append(_implies(s[i-1], s[i]))
+        c.append(_implies_not(s[i-1], xs[i]))
+    return solver.And(c)
+
+def _amo_commander(xs : tp.Sequence[Term], vars : Modeler, solver : Solver, group_size : int = 3) -> Term:
+    '''
+        commander encoding (Klieber & Kwon 2007), xs are split into groups
+        each with a commander which is set iff a member of the group is set
+    '''
+    if len(xs) <= group_size + 1:
+        return _amo_pairwise(xs, vars, solver)
+
+    bv1 = solver.BitVec(1)
+    c = []
+    commanders = []
+    for i in range(0, len(xs), group_size):
+        group = xs[i:i+group_size]
+        cmd = vars.anonymous_var(bv1)
+        c.append(cmd == vars.terms.bv_or(group))
+        c.append(_amo_pairwise(group, vars, solver))
+        commanders.append(cmd)
+    c.append(_amo_commander(commanders, vars, solver, group_size))
+    return solver.And(c)
+
+def _amo_binary(xs : tp.Sequence[Term], vars : Modeler, solver : Solver) -> Term:
+    '''
+        bitwise encoding (Frisch et al. 2005), if xs[i] is set the aux bits
+        spell out i
+    '''
+    bv1 = solver.BitVec(1)
+    bits = [vars.anonymous_var(bv1) for _ in range((len(xs) - 1).bit_length())]
+    c = []
+    for i, x in enumerate(xs):
+        for j, b in enumerate(bits):
+            if (i >> j) & 1:
+                c.append(_implies(x, b))
+            else:
+                c.append(_implies_not(x, b))
+    return solver.And(c)
+
+_AMO_ENCODINGS = {
+    'bv'         : _amo_bv,
+    'pairwise'   : _amo_pairwise,
+    'sequential' : _amo_sequential,
+    'commander'  : _amo_commander,
+    'binary'     : _amo_binary,
+}
 
-def _is_one_hot_or_0(var : Term, solver : Solver):
-    return (var & (var - 1)) == solver.TheoryConst(var.sort, 0)
+ENCODINGS = tuple(_AMO_ENCODINGS)
+DEFAULT_ENCODING = 'bv'
 
-def _is_one_hot(var : Term, solver : Solver) -> Term:
-    return solver.And(_is_one_hot_or_0(var, solver), var != solver.TheoryConst(var.sort, 0))
+def _at_most_one(xs : tp.Sequence[Term], vars : Modeler, solver : Solver, encoding : str) -> Term:
+    if len(xs) < 2:
+        return vars.terms.bool_const(True)
+    return _AMO_ENCODINGS[encoding](xs, vars, solver)
 
-def op_placement(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+def _exactly_one(xs : tp.Sequence[Term], vars : Modeler, solver : Solver, encoding : str) -> Term:
+    if not xs:
+        return vars.terms.bool_const(False)
+    elif len(xs) == 1:
+        return xs[0] == 1
+    elif encoding == 'bv':
+        x = vars.anonymous_var(solver.BitVec(len(xs)))
+        c = [x[idx] == v for idx, v in enumerate(xs)]
+        c.append(_is_one_hot(x, vars, solver))
+        return solver.And(c)
+    else:
+        return solver.And(
+                _at_most_one(xs, vars, solver, encoding),
+                vars.terms.bv_or(xs) == 1)
+
+def op_placement(cgra : MRRG, design : Design, vars : Modeler, solver : Solver, encoding : str = DEFAULT_ENCODING) -> Term:
     ''' Assert all ops are placed exactly one time
     unless they can be duplicated in which case assert they are placed '''
-    bv = solver.BitVec(len(cgra.functional_units))
     c = []
     for op in design.operations:
-        if op.duplicate:
-            c.append(ft.reduce(solver.BVOr, (vars[pe, op] for pe in cgra.functional_units)) == 1)
+        pe_vars = _op_vars(cgra, op, vars)
+        if op.duplicate and pe_vars:
+            c.append(vars.terms.bv_or(pe_vars) == 1)
         else:
-            op_vars = vars.anonymous_var(bv)
-            for idx,pe in enumerate(cgra.functional_units):
-                c.append(op_vars[idx] == vars[pe, op])
-            c.append(_is_one_hot(op_vars, solver))
+            c.append(_exactly_one(pe_vars, vars, solver, encoding))
 
     return solver.And(c)
 
-def pe_exclusivity(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+def pe_exclusivity(cgra : MRRG, design : Design, vars : Modeler, solver : Solver, encoding : str = DEFAULT_ENCODING) -> Term:
     ''' Assert all PEs are used at most one time '''
-    bv = solver.BitVec(len(design.operations))
     c = []
     for pe in cgra.functional_units:
-        pe_vars = vars.anonymous_var(bv)
-        for idx, op in enumerate(design.operations):
-            c.append(pe_vars[idx] == vars[pe, op])
-        c.append(_is_one_hot_or_0(pe_vars, solver))
+        c.append(_at_most_one(_pe_vars(pe, design, vars), vars, solver, encoding))
 
     return solver.And(c)
 
@@ -64,24 +283,21 @@ def pe_legality(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -
     c = []
     for pe in cgra.functional_units:
         for op in design.operations:
-            if op.opcode not in pe.ops:
+            if op.opcode not in pe.ops and (pe, op) in vars:
                 c.append(vars[pe, op] == 0)
     return solver.And(c)
 
-def route_exclusivity(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+def route_exclusivity(cgra : MRRG, design : Design, vars : Modeler, solver : Solver, encoding : str = DEFAULT_ENCODING) -> Term:
     '''
         each routing node is used for at most one value
 
         for all node in nodes:
             popcount(vars[node, value] for value in values) <= 1
     '''
-    bv = solver.BitVec(len(design.values))
     c = []
     for node in cgra.all_nodes:
-        node_vars = vars.anonymous_var(bv)
-        for idx, value in enumerate(design.values):
-            c.append(node_vars[idx] == vars[node, value])
-        c.append(_is_one_hot_or_0(node_vars, solver))
+        value_vars = [vars[node, value] for value in design.values if (node, value) in vars]
+        c.append(_at_most_one(value_vars, vars, solver, encoding))
 
     return solver.And(c)
 
@@ -93,9 +309,14 @@ def routing_resource_usage(cgra : MRRG, design : Design, vars : Modeler, solver
     c = []
     for node in cgra.all_nodes:
         for value in design.values:
+            if (node, value) not in vars:
+                continue
             v = vars[node, value]
-            v_ = ft.reduce(solver.BVOr, (vars[node, value, dst] for dst in value.dsts))
-            c.append(v == v_)
+            dst_vars = [vars[node, value, dst] for dst in value.dsts if (node, value, dst) in vars]
+            if dst_vars:
+                c.append(v == vars.terms.bv_or(dst_vars))
+            else:
+                c.append(v == 0)
 
     return solver.And(c)
 
@@ -107,41 +328,56 @@ def init_value(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) ->
     for pe in cgra.functional_units:
         for value in design.values:
             src = value.src
-            v = vars[pe, src]
-            if src.opcode not in pe.ops:
-               c.append(vars[pe, value] == 0)
+            if src.opcode not in pe.ops or (pe, src) not in vars:
+                if (pe, value) in vars:
+                    c.append(vars[pe, value] == 0)
             elif src.duplicate:
-                v_ = vars[pe, value]
+                v = vars[pe, src]
+                v_ = vars.get((pe, value), _zero(vars))
                 c.append(v == v_)
             else:
+                v = vars[pe, src]
                 for dst in value.dsts:
-                    v_ = vars[pe, value, dst]
+                    v_ = vars.get((pe, value, dst), _zero(vars))
                     c.append(v == v_)
 
     return solver.And(c)
 
 def port_placement(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
     '''
-        values terminate at the input port of their op
+        values terminate at the input port of their op, or at the other
+        operand port if the operands of the op are swapped
     '''
     c = []
+    for pe in cgra.functional_units:
+        for op in design.operations:
+            if (pe, op, SWAP) in vars:
+                c.append(_implies(vars[pe, op, SWAP], vars.get((pe, op), _zero(vars))))
+
     for pe in cgra.functional_units:
         for value in design.values:
             for dst in value.dsts:
                 op, operand = dst
-                if op.opcode not in pe.ops:
+                if op.opcode not in pe.ops or (pe, op) not in vars:
                     for port in pe.operands.values():
-                        v_ = vars[port, value, dst]
-                        c.append(v_ == 0)
+                        if (port, value, dst) in vars:
+                            c.append(vars[port, value, dst] == 0)
+                elif (pe, op, SWAP) in vars:
+                    v = vars[pe, op]
+                    swap = vars[pe, op, SWAP]
+                    v_ = vars.get((pe.operands[operand], value, dst), _zero(vars))
+                    v_swap = vars.get((pe.operands[1 - operand], value, dst), _zero(vars))
+                    c.append(v_ == (v & ~swap))
+                    c.append(v_swap == (v & swap))
                 else:
                     port = pe.operands[operand]
                     v = vars[pe, op]
-                    v_ = vars[port, value, dst]
+                    v_ = vars.get((port, value, dst), _zero(vars))
                     c.append(v == v_)
 
     return solver.And(c)
 
-def input_connectivity(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+def input_connectivity(cgra : MRRG, design : Design, vars : Modeler, solver : Solver, encoding : str = DEFAULT_ENCODING) -> Term:
     '''
         if node used to route a value then exactly one of its inputs also
         routes that value
@@ -149,37 +385,164 @@ def input_connectivity(cgra : MRRG, design : Design, vars : Modeler, solver : So
 
     c = []
     for node in cgra.routing_nodes:
-        l = len(node.inputs.values())
-        bv = solver.BitVec(l)
         for value in design.values:
             for dst in value.dsts:
+                if (node, value, dst) not in vars:
+                    continue
                 v = vars[node, value, dst]
-                i_vars = vars.anonymous_var(bv)
-                for idx, n in enumerate(node.inputs.values()):
-                    c.append(i_vars[idx] == vars[n, value, dst])
-
-                c.append(solver.Or(v == 0, _is_one_hot(i_vars, solver)))
+                in_vars = [vars[n, value, dst] for n in node.inputs.values() if (n, value, dst) in vars]
+                if not in_vars:
+                    c.append(v == 0)
+                else:
+                    c.append(solver.Or(v == 0, _exactly_one(in_vars, vars, solver, encoding)))
 
     return solver.And(c)
 
-def output_connectivity(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+def output_connectivity(cgra : MRRG, design : Design, vars : Modeler, solver : Solver, encoding : str = DEFAULT_ENCODING) -> Term:
     '''
         if node used to route a value then exactly one of its outputs also
         routes that value
     '''
     c = []
     for node in cgra.all_nodes:
-        bv = solver.BitVec(len(node.outputs.values()))
+        if isinstance(node, mrrg.FU_Port):
+            continue
         for value in design.values:
-            if isinstance(node, mrrg.FU_Port):
-                continue
             for dst in value.dsts:
+                if (node, value, dst) not in vars:
+                    continue
                 v = vars[node, value, dst]
-                i_vars = vars.anonymous_var(bv)
-                for idx, n in enumerate(node.outputs.values()):
-                    c.append(i_vars[idx] == vars[n, value, dst])
-                c.append(solver.Or(v == 0, _is_one_hot(i_vars, solver)))
+                out_vars = [vars[n, value, dst] for n in node.outputs.values() if (n, value, dst) in vars]
+                if not out_vars:
+                    c.append(v == 0)
+                else:
+                    c.append(solver.Or(v == 0, _exactly_one(out_vars, vars, solver, encoding)))
 
     return solver.And(c)
 
+def _lex_leq(xs : tp.Sequence[Term], ys : tp.Sequence[Term], vars : Modeler, solver : Solver) -> Term:
+    '''
+        xs <= ys lexicographically, eq[i] is set if xs[:i+1] == ys[:i+1]
+    '''
+    bv1 = solver.BitVec(1)
+    c = []
+    eq = None
+    for i, (x, y) in enumerate(zip(xs, ys)):
+        if eq is None:
+            c.append(_implies(x, y))
+        else:
+            c.append((eq & x & ~y) == 0)
+        if i == len(xs) - 1:
+            break
+        e = vars.anonymous_var(bv1)
+        c.append(e == (~(x ^ y) if eq is None else eq & ~(x ^ y)))
+        eq = e
+    return solver.And(c)
+
+def _lex_leader(
+        order : tp.Sequence[tp.Tuple[mrrg.FunctionalUnit, design.Operation]],
+        image : tp.Callable,
+        vars : Modeler,
+        solver : Solver) -> Term:
+    ''' the placement is not greater than the placement moved by image '''
+    xs, ys = [], []
+    for k in order:
+        k_ = image(k)
+        if k == k_ or (k not in vars and k_ not in vars):
+            continue
+        xs.append(vars.get(k, _zero(vars)))
+        ys.append(vars.get(k_, _zero(vars)))
+    return _lex_leq(xs, ys, vars, solver)
+
+def fabric_symmetry(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+    '''
+        lex-leader constraints for the automorphisms of the fabric, for
+        every automorphism g the placement must not be greater than the
+        placement moved by g.  Automorphisms which move pinned keys are
+        skipped.  Routing windows with slack count hops through tie nodes
+        so they are not symmetric, with them this may cut off solutions.
+    '''
+    order = symmetry.placement_order(cgra, design)
+    c = []
+    for g in symmetry.fabric_automorphisms(cgra):
+        if symmetry.respects_pins(g, vars.pins):
+            c.append(_lex_leader(order, lambda k : (g[k[0]], k[1]), vars, solver))
+
+    return solver.And(c)
+
+def design_symmetry(cgra : MRRG, design : Design, vars : Modeler, solver : Solver) -> Term:
+    '''
+        lex-leader constraints for the automorphisms of the design, orders
+        interchangeable operations.  Uses the same order as fabric_symmetry
+        so both may be used together.
+    '''
+    order = symmetry.placement_order(cgra, design)
+    c = []
+    for g in symmetry.design_automorphisms(design):
+        if symmetry.respects_pins(g, vars.pins, (Operation, Value)):
+            c.append(_lex_leader(order, lambda k : (k[0], g[k[1]]), vars, solver))
+
+    return solver.And(c)
+
+ONE_HOT_GENERATORS = (
+    op_placement,
+    pe_exclusivity,
+    route_exclusivity,
+    input_connectivity,
+    output_connectivity,
+)
+
+# generators which only touch placement vars
+PLACEMENT_GENERATORS = (
+    init_placement_vars,
+    init_placement_vars_sparse,
+    op_placement,
+    pe_exclusivity,
+    pe_legality,
+    fabric_symmetry,
+    design_symmetry,
+)
+
+def is_placement_stage(f : ConstraintGeneratorType) -> bool:
+    ''' whether f only constrains placement, looks through bound encodings '''
+    if isinstance(f, ft.partial):
+        f = f.func
+    return f in PLACEMENT_GENERATORS
+
+def with_encoding(f : ConstraintGeneratorType, encoding : str) -> ConstraintGeneratorType:
+    ''' bind the one-hot encoding used by a constraint generator '''
+    if f not in ONE_HOT_GENERATORS:
+        raise ValueError(f'{f.__qualname__} does not take an encoding')
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unknown encoding: {encoding}')
+
+    p = ft.partial(f, encoding=encoding)
+    suffix = f'({encoding!r})'
+    p.__name__ = f.__name__ + suffix
+    p.__qualname__ = f.__qualname__ + suffix
+    return p
+
+def set_encodings(
+        funcs : tp.Sequence[ConstraintGeneratorType],
+        encoding : str = DEFAULT_ENCODING,
+        overrides : tp.Optional[tp.Mapping[str, str]] = None,
+        ) -> tp.Tuple[ConstraintGeneratorType, ...]:
+    '''
+        bind encoding to every generator in funcs which takes one,
+        overrides maps generator names to encodings.  Generators which
+        already have an encoding bound are rebound.
+    '''
+    if overrides is None:
+        overrides = {}
+    for name in overrides:
+        if name not in {f.__name__ for f in ONE_HOT_GENERATORS}:
+            raise ValueError(f'{name} does not take an encoding')
 
+    new_funcs = []
+    for f in funcs:
+        if isinstance(f, ft.partial) and f.func in ONE_HOT_GENERATORS:
+            f = f.func
+        if f in ONE_HOT_GENERATORS:
+            f = with_encoding(f, overrides.get(f.__name__, encoding))
+        new_funcs.append(f)
+    return tuple(new_funcs)
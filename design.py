@@ -2,6 +2,9 @@ import typing as tp
 from util import IDObject, NamedIDObject, SortedDict
 from util import BiMultiDict, MultiDict, SortedFrozenSet, MapView
 
+# opcodes whose two operands may be swapped
+COMMUTATIVE_OPCODES = frozenset(('add', 'mul', 'and', 'or', 'xor'))
+
 class Value(IDObject):
     '''
        Holds a collection of ties that make up a net.
@@ -35,6 +38,7 @@ class Operation(NamedIDObject):
     _output : tp.Optional[Value]
     _opcode : str
     _duplicate : bool
+    _commute : bool
 
     def __init__(self, name : str, opcode :str):
         super().__init__(name)
@@ -42,6 +46,7 @@ class Operation(NamedIDObject):
         self._output = None
         self._opcode = opcode
         self._duplicate = False
+        self._commute = False
 
     @property
     def inputs(self) -> MapView[int, Value]:
@@ -70,6 +75,15 @@ class Operation(NamedIDObject):
     def allow_duplicate(self):
         self._duplicate = True
 
+    @property
+    def commute(self) -> bool:
+        return self._commute
+
+    def allow_commute(self):
+        ''' let the values tied to operands 0 and 1 land on either port '''
+        assert set(self.inputs) == {0, 1}, self
+        self._commute = True
+
 class Design(NamedIDObject):
     def __init__(self, mods : dict, ties : set, name : str = ""):
         super().__init__(name)
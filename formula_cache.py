@@ -0,0 +1,148 @@
+'''
+    On-disk cache of built formulas.
+
+    The clauses asserted by the init and constraint generators are stored
+    in DIMACS together with the variable of every modeler key, in a
+    directory addressed by a hash of the fabric, design, generators,
+    options and the source of the modules which build the formula.  A hit
+    skips constraint building, the MRRG and design are still needed to
+    decode models and build the objective.  Requires the CNF backend.
+'''
+import hashlib
+import json
+import os
+import tempfile
+import typing as tp
+
+import adlparse
+import cnf
+import constraints
+import design
+import dotparse
+import modeler
+import mrrg
+import symmetry
+from cnf import CNFSolver
+from constraints import ConstraintGeneratorType
+from design import Design
+from modeler import Modeler
+from mrrg import MRRG
+
+# modules whose source is part of the key
+CODE_MODULES = (adlparse, cnf, constraints, design, dotparse, modeler, mrrg, symmetry)
+
+def code_version() -> str:
+    h = hashlib.sha256()
+    for m in CODE_MODULES:
+        with open(m.__file__, 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+def cache_key(
+        fabric_file : str,
+        design_file : str,
+        funcs : tp.Sequence[ConstraintGeneratorType],
+        **params) -> str:
+    '''
+        hash of the input files, the generators (by qualified name, which
+        includes bound encodings) and params (e.g. contexts, duplicate flags,
+        sparse/prune/slack), params must be JSON serializable
+    '''
+    h = hashlib.sha256()
+    h.update(code_version().encode())
+    for path in (fabric_file, design_file):
+        with open(path, 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    h.update(json.dumps([f.__qualname__ for f in funcs]).encode())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+def pinned_key(key : str, pins : tp.Mapping[tp.Any, int]) -> str:
+    ''' key of the formula built under pins (see Modeler.pin) '''
+    if not pins:
+        return key
+    h = hashlib.sha256(key.encode())
+    table = sorted(json.dumps([_encode_key(k), v]) for k, v in pins.items())
+    h.update(json.dumps(table).encode())
+    return h.hexdigest()
+
+def _encode_key(key):
+    if isinstance(key, design.Value):
+        return {'v' : key.src.name}
+    elif isinstance(key, design.Operation):
+        return {'o' : key.name}
+    elif isinstance(key, mrrg.Node):
+        return {'n' : key.name}
+    elif isinstance(key, tuple):
+        return list(map(_encode_key, key))
+    elif isinstance(key, (int, str)):
+        return key
+    else:
+        raise TypeError(f'Cannot encode {key!r}')
+
+def _decode_key(key, objs):
+    if isinstance(key, dict):
+        (kind, name), = key.items()
+        return objs[kind][name]
+    elif isinstance(key, list):
+        return tuple(_decode_key(k, objs) for k in key)
+    else:
+        return key
+
+class FormulaCache:
+    _directory : str
+
+    def __init__(self, directory : str):
+        self._directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key : str) -> tp.Tuple[str, str]:
+        base = os.path.join(self._directory, key)
+        return base + '.cnf', base + '.vars.json'
+
+    def __contains__(self, key : str) -> bool:
+        return all(map(os.path.exists, self._paths(key)))
+
+    def store(self, key : str, solver : CNFSolver, vars : Modeler) -> None:
+        cnf_path, vars_path = self._paths(key)
+        table = []
+        for k, t in vars.items():
+            # pinned keys are restored by the modeler itself
+            if k in vars.pins:
+                continue
+            try:
+                table.append([_encode_key(k), t.lit])
+            except TypeError:
+                pass
+        # write to temporaries so concurrent runs never see partial files
+        for path, write in (
+                (cnf_path, solver.write_dimacs),
+                (vars_path, lambda f : json.dump(table, f))):
+            fd, tmp = tempfile.mkstemp(dir=self._directory)
+            with os.fdopen(fd, 'w') as f:
+                write(f)
+            os.replace(tmp, path)
+
+    def load(self,
+            key : str,
+            cgra : MRRG,
+            design : Design,
+            solver : CNFSolver,
+            vars : Modeler) -> bool:
+        ''' restore the formula into a fresh solver and modeler, returns False on a miss '''
+        if key not in self:
+            return False
+        cnf_path, vars_path = self._paths(key)
+
+        objs = {
+            'n' : {n.name : n for n in cgra.all_nodes},
+            'o' : {op.name : op for op in design.operations},
+            'v' : {v.src.name : v for v in design.values},
+        }
+
+        with open(cnf_path) as f:
+            solver.read_dimacs(f)
+        with open(vars_path) as f:
+            for k, lit in json.load(f):
+                vars.adopt_var(_decode_key(k, objs), solver.literal(lit))
+        return True
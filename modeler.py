@@ -1,26 +1,388 @@
 import typing as tp
 import itertools as it
+import functools as ft
+import json
 from collections.abc import Mapping
 import mrrg
 import design
 from smt_switch_types import Solver, Term, Sort
-from util import BiDict, BiMultiDict
+from util import BiDict, BiMultiDict, IDObject, MapView
 
 Model = tp.Mapping[tp.Any, int]
 ModelReader = tp.Callable[[mrrg.MRRG, design.Design, Model], tp.Any]
 
+class ArrayModel(Mapping):
+    '''
+        Model stored as one byte per variable, indexed by the position the
+        variable was declared at.  Values which do not fit a byte (popcounts)
+        are kept in a small dict.  The index is shared with the modeler and
+        every other model it saved, the first len(values) keys of the index
+        are the keys of this model.
+    '''
+    __slots__ = '_index', '_values', '_wide'
+    _index : tp.Mapping[tp.Any, int]
+    _values : bytearray
+    _wide : tp.Mapping[int, int]
+
+    def __init__(self, index : tp.Mapping[tp.Any, int], values : tp.List[int]):
+        wide = {i : v for i, v in enumerate(values) if v > 0xff}
+        if wide:
+            values = [0 if v > 0xff else v for v in values]
+        self._index = index
+        self._values = bytearray(values)
+        self._wide = wide
+
+    def __getitem__(self, key) -> int:
+        i = self._index[key]
+        if i >= len(self._values):
+            raise KeyError(key)
+        try:
+            return self._wide[i]
+        except KeyError:
+            return self._values[i]
+
+    def __iter__(self) -> tp.Iterator:
+        return it.islice(self._index, len(self._values))
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def to_sparse(self) -> 'SparseModel':
+        ones = frozenset(i for i, v in enumerate(self._values) if v == 1)
+        wide = {i : v for i, v in enumerate(self._values) if v > 1}
+        wide.update(self._wide)
+        return SparseModel(self._index, len(self._values), ones, wide)
+
+class Delta(tp.NamedTuple):
+    ''' difference between two SparseModels over the same index '''
+    flips : tp.FrozenSet[int]
+    wide : tp.Mapping[int, int]
+
+class SparseModel(Mapping):
+    '''
+        Model stored as the indices of the variables which are 1, values
+        above 1 (popcounts) are kept in a small dict.  Same indexing as
+        ArrayModel.
+    '''
+    __slots__ = '_index', '_n', '_ones', '_wide'
+    _index : tp.Mapping[tp.Any, int]
+    _n : int
+    _ones : tp.FrozenSet[int]
+    _wide : tp.Mapping[int, int]
+
+    def __init__(self,
+            index : tp.Mapping[tp.Any, int],
+            n : int,
+            ones : tp.FrozenSet[int],
+            wide : tp.Mapping[int, int]):
+        self._index = index
+        self._n = n
+        self._ones = ones
+        self._wide = wide
+
+    def __getitem__(self, key) -> int:
+        i = self._index[key]
+        if i >= self._n:
+            raise KeyError(key)
+        try:
+            return self._wide[i]
+        except KeyError:
+            return int(i in self._ones)
+
+    def __iter__(self) -> tp.Iterator:
+        return it.islice(self._index, self._n)
+
+    def __len__(self) -> int:
+        return self._n
+
+    @property
+    def ones(self) -> tp.FrozenSet[int]:
+        return self._ones
+
+    def delta(self, prev : 'SparseModel') -> Delta:
+        ''' the delta which turns prev into self '''
+        assert self._n == prev._n
+        wide = {i : v for i, v in self._wide.items() if prev._wide.get(i) != v}
+        wide.update((i, 0) for i in prev._wide if i not in self._wide)
+        return Delta(self._ones ^ prev._ones, wide)
+
+    def apply(self, delta : Delta) -> 'SparseModel':
+        wide = {i : v for i, v in it.chain(self._wide.items(), delta.wide.items())}
+        wide = {i : v for i, v in wide.items() if v}
+        return SparseModel(self._index, self._n, self._ones ^ delta.flips, wide)
+
+def _describe_key(key):
+    if isinstance(key, design.Value):
+        return f'value({key.src.name})'
+    elif isinstance(key, IDObject):
+        return key.name
+    elif isinstance(key, tuple):
+        return list(map(_describe_key, key))
+    elif isinstance(key, (int, str)):
+        return key
+    else:
+        return repr(key)
+
+def _freeze_key(key):
+    if isinstance(key, list):
+        return tuple(map(_freeze_key, key))
+    return key
+
+class ModelLog:
+    '''
+        Stream of models as JSON lines.  The first model over a set of keys
+        is written with a key table (by name) and its set variables, every
+        following one as the delta to its predecessor.
+    '''
+    _file : tp.TextIO
+    _keys : tp.Optional[tp.List[tp.Any]]
+    _prev : tp.Optional[SparseModel]
+
+    def __init__(self, file : tp.TextIO):
+        self._file = file
+        self._keys = None
+        self._prev = None
+
+    def append(self, model : tp.Union[ArrayModel, SparseModel], **info) -> None:
+        ''' info is stored with the model, e.g. its eval '''
+        if isinstance(model, ArrayModel):
+            model = model.to_sparse()
+
+        prev = self._prev
+        if prev is None or not (prev._index is model._index and prev._n == model._n):
+            keys = list(model)
+            if keys != self._keys:
+                self._write(keys=[_describe_key(k) for k in keys])
+                self._keys = keys
+            self._write(ones=sorted(model.ones), wide=model._wide, **info)
+        else:
+            d = model.delta(prev)
+            self._write(flips=sorted(d.flips), wide=d.wide, **info)
+        self._prev = model
+
+    def _write(self, **record) -> None:
+        self._file.write(json.dumps(record))
+        self._file.write('\n')
+        self._file.flush()
+
+    @staticmethod
+    def read(file : tp.TextIO) -> tp.Iterator[tp.Tuple[SparseModel, tp.Mapping[str, tp.Any]]]:
+        '''
+            yields (model, info) for every logged model, the keys of the
+            models are the key descriptions from the key table
+        '''
+        index = None
+        model = None
+        for line in file:
+            record = json.loads(line)
+            if 'keys' in record:
+                keys = record.pop('keys')
+                index = {_freeze_key(k) : i for i, k in enumerate(keys)}
+                continue
+            wide = {int(i) : v for i, v in record.pop('wide').items()}
+            if 'ones' in record:
+                model = SparseModel(index, len(index), frozenset(record.pop('ones')), wide)
+            else:
+                model = model.apply(Delta(frozenset(record.pop('flips')), wide))
+            yield model, record
+
+class LazyModel(Mapping):
+    '''
+        Model which reads a variable from the solver the first time it is
+        accessed.  Values are only available until the modeler is
+        invalidated (i.e. the solver is checked again), materialize before
+        that to keep the model.
+    '''
+    _modeler : 'Modeler'
+    _generation : int
+    _values : tp.MutableMapping[tp.Any, int]
+
+    def __init__(self, modeler : 'Modeler'):
+        self._modeler = modeler
+        self._generation = modeler.generation
+        self._values = dict()
+
+    def _check(self) -> None:
+        if self._generation != self._modeler.generation:
+            raise RuntimeError('model read after the solver was checked again')
+
+    def __getitem__(self, key) -> int:
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        self._check()
+        t = self._modeler[key]
+        v = self._values[key] = self._modeler._solver.GetValue(t).as_int()
+        return v
+
+    def __iter__(self) -> tp.Iterator:
+        return iter(self._modeler)
+
+    def __len__(self) -> int:
+        return len(self._modeler)
+
+    def prefetch(self, keys : tp.Iterable) -> None:
+        ''' read the variables of keys which are not read yet at once '''
+        self._check()
+        keys = [k for k in keys if k not in self._values]
+        if keys:
+            self._values.update(zip(keys, self._modeler.read_values(keys)))
+
+    def materialize(self) -> ArrayModel:
+        ''' read every variable '''
+        self._check()
+        return self._modeler.save_model()
+
+class TermCache:
+    '''
+        Hash-conses constants and n-ary or/and terms so constraint builders
+        which need the same subterm share one instance.  Terms are keyed by
+        id and kept alive by the cache, so ids are not reused.
+    '''
+    _solver : Solver
+    _terms : tp.MutableMapping[tp.Any, tp.Tuple[Term, tp.Tuple[Term, ...]]]
+    hits : int
+    misses : int
+
+    def __init__(self, solver : Solver):
+        self._solver = solver
+        self.clear()
+
+    def clear(self) -> None:
+        self._terms = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, key, build : tp.Callable[[], Term], args : tp.Tuple[Term, ...] = ()) -> Term:
+        try:
+            t = self._terms[key][0]
+        except KeyError:
+            self.misses += 1
+            t = build()
+            self._terms[key] = t, args
+        else:
+            self.hits += 1
+        return t
+
+    def bool_const(self, value : bool) -> Term:
+        solver = self._solver
+        return self._get(('bool', value), lambda : solver.TheoryConst(solver.Bool(), value))
+
+    def bv_const(self, width : int, value : int) -> Term:
+        solver = self._solver
+        return self._get(('bv', width, value), lambda : solver.TheoryConst(solver.BitVec(width), value))
+
+    def bv_or(self, terms : tp.Iterable[Term]) -> Term:
+        terms = tuple(terms)
+        key = ('or', *sorted(map(id, terms)))
+        return self._get(key, lambda : ft.reduce(self._solver.BVOr, terms), terms)
+
+    def bv_and(self, terms : tp.Iterable[Term]) -> Term:
+        terms = tuple(terms)
+        key = ('and', *sorted(map(id, terms)))
+        return self._get(key, lambda : ft.reduce(self._solver.BVAnd, terms), terms)
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(hits={self.hits}, misses={self.misses})'
+
+# variable namespaces
+PLACEMENT = 'placement'      # (pe, op) and (pe, op, SWAP)
+ROUTING = 'routing'          # (node, value)
+DST_ROUTING = 'dst_routing'  # (node, value, dst)
+AUX = 'aux'                  # anonymous_var, keyed by their id
+OBJECTIVE = 'objective'      # every other key
+NAMESPACES = (PLACEMENT, ROUTING, DST_ROUTING, AUX, OBJECTIVE)
+
+# (pe, op, SWAP) is set if the operands of op are swapped on pe
+SWAP = 'swap'
+
+def namespace_of(key) -> str:
+    ''' namespace of a keyed variable '''
+    if isinstance(key, tuple) and len(key) in (2, 3) and isinstance(key[1], design.Value):
+        return ROUTING if len(key) == 2 else DST_ROUTING
+    elif isinstance(key, tuple) and (len(key) == 2 or len(key) == 3 and key[2] == SWAP) \
+            and isinstance(key[0], mrrg.FunctionalUnit) and isinstance(key[1], design.Operation):
+        return PLACEMENT
+    return OBJECTIVE
+
 class Modeler(Mapping):
     _var_counter = it.count()
     _solver : Solver
     _vars : tp.MutableMapping[tp.Any, Term]
+    # namespace -> key -> id within the namespace
+    _ids : tp.Mapping[str, tp.MutableMapping[tp.Any, int]]
+    # solver symbol -> (namespace, key)
+    _names : tp.MutableMapping[str, tp.Tuple[str, tp.Any]]
+    # key -> position in _vars, shared by the ArrayModels from save_model
+    _index : tp.MutableMapping[tp.Any, int]
+    # [(concatenation, widths)] used by save_model, None when stale
+    _chunks : tp.Optional[tp.List[tp.Tuple[Term, tp.List[int]]]]
+    # (keys, chunks) of the last read_values, None when stale
+    _key_chunks : tp.Optional[tp.Tuple[tp.Tuple, tp.List[tp.Tuple[Term, tp.List[int]]]]]
+    # bumped by invalidate, LazyModels from older generations are stale
+    _generation : int
+    _terms : TermCache
+    # key -> pinned value, kept across resets
+    _pins : tp.MutableMapping[tp.Any, int]
+
+    # max width of a concatenation read by save_model
+    CHUNK_WIDTH = 4096
 
     def __init__(self, solver : Solver):
         self._solver = solver
         self._vars = dict()
+        self._index = dict()
+        self._chunks = None
+        self._key_chunks = None
+        self._generation = 0
+        self._terms = TermCache(solver)
+        self._pins = dict()
+        self._init_registry()
+
+    def _init_registry(self) -> None:
+        self._ids = {ns : dict() for ns in NAMESPACES}
+        self._names = dict()
+
+    def _register(self, namespace : str, key) -> str:
+        ids = self._ids[namespace]
+        if namespace == AUX:
+            key = len(ids)
+        name = self.gen_name()
+        ids[key] = len(ids)
+        self._names[name] = namespace, key
+        return name
+
+    def _declare(self, namespace : str, key, sort : Sort) -> Term:
+        return self._solver.DeclareConst(self._register(namespace, key), sort)
+
+    def _add(self, key, t : Term) -> None:
+        self._vars[key] = t
+        self._index[key] = len(self._index)
+        self._chunks = None
 
-    def init_var(self, key, sort : Sort) -> Term:
+    def init_var(self, key, sort : Sort, namespace : tp.Optional[str] = None) -> Term:
+        '''
+            declare the variable for key, namespace defaults to namespace_of(key).
+            Pinned keys are not declared, see pin.
+        '''
+        pinned = self._pins.get(key)
+        if pinned is not None:
+            return self._terms.bv_const(sort.width, pinned)
         assert key not in self._vars, key
-        self._vars[key] = t = self.anonymous_var(sort)
+        if namespace is None:
+            namespace = namespace_of(key)
+        t = self._declare(namespace, key, sort)
+        self._add(key, t)
+        return t
+
+    def adopt_var(self, key, t : Term, namespace : tp.Optional[str] = None) -> Term:
+        ''' use an existing solver variable for key, e.g. one loaded from a file '''
+        assert key not in self._vars, key
+        if namespace is None:
+            namespace = namespace_of(key)
+        self._register(namespace, key)
+        self._add(key, t)
         return t
 
     def __getitem__(self, key) -> Term:
@@ -32,24 +394,191 @@ class Modeler(Mapping):
     def __len__(self) -> int:
         return self._vars.__len__()
 
-    def save_model(self) -> Model:
+    def _concat(self, terms : tp.Sequence[Term]) -> Term:
+        # balanced so the term stays shallow, terms[0] ends in the high bits
         solver = self._solver
-        d = dict()
-        for k,v in self._vars.items():
-            d[k] = solver.GetValue(v).as_int()
+        while len(terms) > 1:
+            terms = [solver.Concat(*terms[i:i+2]) if i + 1 < len(terms) else terms[i]
+                    for i in range(0, len(terms), 2)]
+        return terms[0]
 
-        return d
+    def _build_chunks(self, terms : tp.Iterable[Term]) -> tp.List[tp.Tuple[Term, tp.List[int]]]:
+        chunks = []
+        group = []
+        widths = []
+        total = 0
+        for t in terms:
+            w = t.sort.width
+            if widths and total + w > self.CHUNK_WIDTH:
+                chunks.append((self._concat(group), widths))
+                group, widths, total = [], [], 0
+            group.append(t)
+            widths.append(w)
+            total += w
+        if group:
+            chunks.append((self._concat(group), widths))
+        return chunks
+
+    def _read_chunks(self, chunks : tp.List[tp.Tuple[Term, tp.List[int]]]) -> tp.List[int]:
+        values = []
+        for t, widths in chunks:
+            x = self._solver.GetValue(t).as_int()
+            vs = []
+            for w in reversed(widths):
+                vs.append(x & ((1 << w) - 1))
+                x >>= w
+            values.extend(reversed(vs))
+        return values
+
+    def save_model(self) -> ArrayModel:
+        '''
+            read every variable at once: with the solver's GetValues if it
+            has one, otherwise with one GetValue per concatenation of up to
+            CHUNK_WIDTH bits of variables
+        '''
+        solver = self._solver
+        if hasattr(solver, 'GetValues'):
+            return ArrayModel(self._index, solver.GetValues(self._vars.values()))
+
+        if self._chunks is None:
+            self._chunks = self._build_chunks(self._vars.values())
+        return ArrayModel(self._index, self._read_chunks(self._chunks))
+
+    def read_values(self, keys : tp.Sequence) -> tp.List[int]:
+        '''
+            read the variables of keys at once like save_model.  The
+            concatenations of the last keys read are kept so reading the
+            same keys after every check does not build new terms.
+        '''
+        solver = self._solver
+        if hasattr(solver, 'GetValues'):
+            return solver.GetValues([self._vars[k] for k in keys])
+
+        keys = tuple(keys)
+        if self._key_chunks is None or self._key_chunks[0] != keys:
+            self._key_chunks = keys, self._build_chunks(self._vars[k] for k in keys)
+        return self._read_chunks(self._key_chunks[1])
+
+    def lazy_model(self) -> LazyModel:
+        ''' model of the last check which is read on demand '''
+        return LazyModel(self)
+
+    def invalidate(self) -> None:
+        ''' called by PNR before every check of the solver, LazyModels taken before go stale '''
+        self._generation += 1
+
+    @property
+    def generation(self) -> int:
+        return self._generation
 
     def reset(self) -> None:
+        self.invalidate()
         self._vars = dict()
+        # models saved before the reset keep the old index
+        self._index = dict()
+        self._chunks = None
+        self._key_chunks = None
+        self._terms.clear()
+        self._init_registry()
+        for key, value in self._pins.items():
+            if value:
+                self._add(key, self._terms.bv_const(1, value))
+
+    def pin(self, key, value : int) -> None:
+        '''
+            fix the 1-bit variable of key to value.  A key pinned to 1 maps
+            to the constant 1, a key pinned to 0 is never declared so it is
+            treated as 0 like every other missing key.
+            Must be called before the key is declared.
+        '''
+        if key in self._pins:
+            if self._pins[key] != value:
+                raise ValueError(f'{key} is already pinned to {self._pins[key]}')
+            return
+        if key in self._vars:
+            raise ValueError(f'{key} is already declared')
+        self._pins[key] = value
+        if value:
+            self._add(key, self._terms.bv_const(1, value))
+
+    @property
+    def pins(self) -> tp.Mapping[tp.Any, int]:
+        return MapView(self._pins)
+
+    @property
+    def terms(self) -> TermCache:
+        ''' shared subterms of the current formula '''
+        return self._terms
+
+    def ids(self, namespace : str) -> tp.Mapping[tp.Any, int]:
+        ''' key -> id of the variables in namespace, ids are 0..n-1 in declaration order '''
+        return MapView(self._ids[namespace])
+
+    def counts(self) -> tp.Mapping[str, int]:
+        ''' number of variables per namespace '''
+        return {ns : len(ids) for ns, ids in self._ids.items()}
+
+    def lookup(self, name : str) -> tp.Tuple[str, tp.Any]:
+        ''' (namespace, key) of a solver symbol, the key of an auxiliary variable is its id '''
+        return self._names[name]
 
     @classmethod
     def gen_name(cls) -> str:
         return f'V_{next(cls._var_counter)}'
 
     def anonymous_var(self, sort : Sort) -> Term:
-        return self._solver.DeclareConst(self.gen_name(), sort)
+        return self._declare(AUX, None, sort)
+
+
+class Ref(tp.NamedTuple):
+    ''' stands in for a node, operation or value of a model key '''
+    id : int
+
+def _encode_key(key):
+    if isinstance(key, IDObject):
+        return Ref(key.id)
+    elif isinstance(key, tuple):
+        return tuple(map(_encode_key, key))
+    elif isinstance(key, (int, str)):
+        return key
+    else:
+        raise TypeError(f'Cannot encode {key!r}')
+
+def _decode_key(key, objs : tp.Mapping[int, IDObject]):
+    if isinstance(key, Ref):
+        return objs[key.id]
+    elif isinstance(key, tuple):
+        return tuple(_decode_key(k, objs) for k in key)
+    else:
+        return key
+
+def encode_model(model : Model) -> Model:
+    '''
+        replace the nodes, operations and values in the keys of model by
+        their ids so it can be pickled without the graphs they belong to.
+        Only keys which are made of graph objects, ints and strings are kept.
+    '''
+    d = dict()
+    for k, v in model.items():
+        try:
+            d[_encode_key(k)] = v
+        except TypeError:
+            pass
+    return d
+
+def decode_model(cgra : mrrg.MRRG, design : design.Design, model : Model) -> Model:
+    ''' inverse of encode_model, cgra and design must be the encoded ones (or forks of them) '''
+    objs = dict()
+    for obj in it.chain(cgra.all_nodes, design.operations, design.values):
+        objs[obj.id] = obj
+    return {_decode_key(k, objs) : v for k, v in model.items()}
 
+def operand_port(model : Model, pe : mrrg.FunctionalUnit, dst : tp.Tuple[design.Operation, int]) -> mrrg.FU_Port:
+    ''' the port of pe which receives dst, the operands of commutative ops may be swapped '''
+    op, operand = dst
+    if model.get((pe, op, SWAP), 0) == 1:
+        operand = 1 - operand
+    return pe.operands[operand]
 
 def _get_path(
         model : Model,
@@ -64,7 +593,7 @@ def _get_path(
         path.append(node)
         next = None
         for n in node.inputs.values():
-            if model[n, value, dst] == 1:
+            if model.get((n, value, dst), 0) == 1:
                 assert next is None
                 next = n
         if next is None:
@@ -79,7 +608,7 @@ def model_checker(cgra : mrrg.MRRG, design : design.Design, vars : Model) -> Non
 
     for op in design.operations:
         for pe in cgra.functional_units:
-            if vars[pe, op] == 1:
+            if vars.get((pe, op), 0) == 1:
                 if not op.duplicate:
                     assert op not in F_map
                     assert pe not in F_map.I
@@ -88,14 +617,14 @@ def model_checker(cgra : mrrg.MRRG, design : design.Design, vars : Model) -> Non
 
     for node in cgra.all_nodes:
         for value in design.values:
-            if vars[node, value] == 1:
+            if vars.get((node, value), 0) == 1:
                 assert node not in R_map.I
                 R_map[value] = node
 
     for node in cgra.all_nodes:
         for value in design.values:
             for dst in value.dsts:
-                if vars[node, value, dst] == 1:
+                if vars.get((node, value, dst), 0) == 1:
                     assert vars[node, value] == 1
 
     for op in design.operations:
@@ -104,11 +633,11 @@ def model_checker(cgra : mrrg.MRRG, design : design.Design, vars : Model) -> Non
             for dst in value.dsts:
                 assert dst[0] in F_map
                 for _dst_node in F_map[dst[0]]:
-                    dst_node = _dst_node.operands[dst[1]]
+                    dst_node = operand_port(vars, _dst_node, dst)
                     reached = False
                     for pe in F_map[op]:
                         assert pe in R_map[value]
-                        if vars[pe, value, dst]:
+                        if vars.get((pe, value, dst), 0):
                             for n in _get_path(vars, pe, value, dst, dst_node):
                                 assert vars[n, value, dst] == 1
                                 if n == dst_node:
@@ -121,7 +650,7 @@ def routing_stats(cgra : mrrg.MRRG, design : design.Design, vars : Model) -> Non
 
     for pe in cgra.functional_units:
         for op in design.operations:
-            if vars[pe, op] == 1:
+            if vars.get((pe, op), 0) == 1:
                 F_map[op] = pe
     reg = set()
     mux = set()
@@ -132,7 +661,7 @@ def routing_stats(cgra : mrrg.MRRG, design : design.Design, vars : Model) -> Non
                 for dst in value.dsts:
                     assert dst[0] in F_map
                     for _dst_node in F_map[dst[0]]:
-                        dst_node = _dst_node.operands[dst[1]]
+                        dst_node = operand_port(vars, _dst_node, dst)
                         for node in _get_path(vars, pe, value, dst, dst_node):
                             if isinstance(node, mrrg.Register):
                                 reg.add(node)
@@ -148,7 +677,7 @@ def model_info(cgra : mrrg.MRRG, design : design.Design, vars : Model) -> None:
 
     for op in design.operations:
         for pe in cgra.functional_units:
-            if vars[pe, op] == 1:
+            if vars.get((pe, op), 0) == 1:
                 F_map[op] = pe
                 print(f'{op.name}({op.opcode}): {pe.name}')
 
@@ -158,9 +687,9 @@ def model_info(cgra : mrrg.MRRG, design : design.Design, vars : Model) -> None:
             for dst in value.dsts:
                 assert dst[0] in F_map
                 for _dst_node in F_map[dst[0]]:
-                    dst_node = _dst_node.operands[dst[1]]
+                    dst_node = operand_port(vars, _dst_node, dst)
                     for pe in F_map[op]:
-                        if vars[pe, value, dst]:
+                        if vars.get((pe, value, dst), 0):
                             print(f'{op.name}->{dst[0].name}:{dst[1]}')
                             for n in _get_path(vars, pe, value, dst, dst_node):
                                 assert vars[n, value, dst] == 1
@@ -135,6 +135,50 @@ def unwire(src : Node, src_port : str, dst : Node, dst_port : str):
         del dst._operands[src.operand]
 
 
+def distances_from(sources : tp.Iterable[FunctionalUnit]) -> tp.Mapping[Node, int]:
+    '''
+        hop distance to every node which can be reached from sources by
+        routing through non functional units, the sources are included
+    '''
+    dist = {n : 0 for n in sources}
+    frontier = list(dist)
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            d = dist[node] + 1
+            for n in node.outputs.values():
+                if n not in dist and not isinstance(n, FunctionalUnit):
+                    dist[n] = d
+                    next_frontier.append(n)
+        frontier = next_frontier
+    return dist
+
+def distances_to(sinks : tp.Iterable[Node]) -> tp.Mapping[Node, int]:
+    '''
+        hop distance from every node from which sinks can be reached by
+        routing through non functional units, functional units are
+        included but not routed through
+    '''
+    dist = {n : 0 for n in sinks}
+    frontier = [n for n in dist if not isinstance(n, FunctionalUnit)]
+    while frontier:
+        next_frontier = []
+        for node in frontier:
+            d = dist[node] + 1
+            for n in node.inputs.values():
+                if n not in dist:
+                    dist[n] = d
+                    if not isinstance(n, FunctionalUnit):
+                        next_frontier.append(n)
+        frontier = next_frontier
+    return dist
+
+def reachable(sources : tp.Iterable[FunctionalUnit]) -> tp.FrozenSet[Node]:
+    return frozenset(distances_from(sources))
+
+def co_reachable(sinks : tp.Iterable[Node]) -> tp.FrozenSet[Node]:
+    return frozenset(distances_to(sinks))
+
 
 class MRRG:
     def __init__(self, cgra, *, contexts=1, add_tie_nodes=True, greedy_tie_nodes = True, del_registers=True,):
@@ -145,6 +189,7 @@ class MRRG:
 
         reg = dict()
         mux = dict()
+        sites = dict()
 
         for i in range(contexts):
             for loc, block in cgra.blocks.items():
@@ -155,16 +200,19 @@ class MRRG:
                         all[idx] = route[idx] = reg[idx] = Register(name, inst.input_ports, inst.output_ports)
                     else:
                         all[idx] = fu[idx] = FunctionalUnit(name, inst.input_ports, inst.output_ports, **inst.args)
+                    sites[all[idx]] = i, loc, inst.name
 
                 for inst in block.muxes.values():
                     name = f'Mux_{inst.name}_{i}_{loc[0]}_{loc[1]}'
                     idx = i, loc, inst
                     all[idx] = route[idx] = mux[idx] = Mux(name, inst.input_ports, inst.output_ports)
+                    sites[all[idx]] = i, loc, inst.name
 
                 for inst in block.ports.values():
                     name = f'Port_{inst.name}_{i}_{loc[0]}_{loc[1]}'
                     idx = i, loc, inst
                     all[idx] = route[idx] = FU_Port(name, inst.input_ports, inst.output_ports, inst.operand)
+                    sites[all[idx]] = i, loc, inst.name
 
         for i in range(contexts):
             for src_address, dst_address in cgra.ties.items():
@@ -198,6 +246,7 @@ class MRRG:
                 for args in wire_args:
                     wire(*args)
 
+                del sites[all[idx]]
                 del all[idx]
                 del route[idx]
 
@@ -255,6 +304,13 @@ class MRRG:
         self._all = frozenset(all.values())
         self._fu = frozenset(fu.values())
 
+        legal = dict()
+        for unit in self._fu:
+            for op in unit.ops:
+                legal.setdefault(op, set()).add(unit)
+        self._legal = {op : frozenset(units) for op, units in legal.items()}
+        self._sites = sites
+
     @property
     def functional_units(self) -> tp.FrozenSet[FunctionalUnit]:
         return self._fu
@@ -266,3 +322,14 @@ class MRRG:
     @property
     def all_nodes(self) -> tp.FrozenSet[Node]:
         return self._all
+
+    def legal_units(self, opcode : str) -> tp.FrozenSet[FunctionalUnit]:
+        ''' functional units which support opcode '''
+        return self._legal.get(opcode, frozenset())
+
+    def site(self, node : Node) -> tp.Optional[tp.Tuple[int, tp.Tuple[int, int], str]]:
+        '''
+            (context, block location, instance name) node was built from,
+            None for tie nodes
+        '''
+        return self._sites.get(node)
@@ -6,7 +6,7 @@ import mrrg
 import design
 from mrrg import MRRG, Node
 from design import Design, Operation
-from modeler import Modeler, Model, _get_path
+from modeler import Modeler, Model, _get_path, operand_port
 from constraints import ConstraintGeneratorType
 from smt_switch_types import Solver, Term, Sort
 from util.data_structures.priority_queue import PriorityQueue
@@ -14,6 +14,7 @@ from util import BiDict, BiMultiDict
 from util import AutoPartial
 
 EvalType = tp.Callable[[MRRG, Design, Model], int]
+SoftGeneratorType = tp.Callable[[MRRG, Design, Modeler, Solver], tp.Sequence[Term]]
 LowerBoundType = tp.Callable[[MRRG, Design], int]
 OptGeneratorType = tp.Callable[[int, int], ConstraintGeneratorType]
 NodeFilter = tp.Callable[[Node], bool]
@@ -26,6 +27,7 @@ class Optimizer:
     eval_func  : EvalType
     lower_func : LowerBoundType
     limit_func : OptGeneratorType
+    soft_func  : tp.Optional[SoftGeneratorType]
     node_filter   : NodeFilter
 
     def __init__(self,
@@ -34,15 +36,24 @@ class Optimizer:
             eval_wrapper  : WrappedType[EvalType],
             lower_wrapper : WrappedType[LowerBoundType],
             limit_wrapper : WrappedType[OptGeneratorType],
+            soft_wrapper  : tp.Optional[WrappedType[SoftGeneratorType]] = None,
             ):
 
         self.init_func  = init_wrapper(node_filter)
         self.eval_func  = eval_wrapper(node_filter)
         self.lower_func = lower_wrapper(node_filter)
         self.limit_func = limit_wrapper(node_filter)
+        if soft_wrapper is None:
+            self.soft_func = None
+        else:
+            self.soft_func = soft_wrapper(node_filter)
         self.node_filter = node_filter
 
 
+def _node_vars(node : Node, design : Design, vars : Modeler) -> tp.List[Term]:
+    ''' routing vars of node, pruned vars are omitted '''
+    return [vars[node, v] for v in design.values if (node, v) in vars]
+
 @AutoPartial(1)
 def init_popcount_ite(
         node_filter : NodeFilter,
@@ -52,16 +63,17 @@ def init_popcount_ite(
         solver : Solver) -> Term:
 
     nodes = [n for n in cgra.all_nodes if node_filter(n)]
-    bv = solver.BitVec(len(nodes).bit_length())
-    zero = solver.TheoryConst(bv, 0)
-    one  = solver.TheoryConst(bv, 1)
+    width = max(len(nodes).bit_length(), 1)
+    bv = solver.BitVec(width)
+    zero = vars.terms.bv_const(width, 0)
+    one  = vars.terms.bv_const(width, 1)
 
     expr = ft.reduce(solver.BVAdd,
             map(lambda x : solver.Ite(x == 0, zero, one),
-                (ft.reduce(solver.BVOr,
-                    (vars[n, v] for v in design.values)
-                ) for n in nodes)
-            )
+                (vars.terms.bv_or(vs)
+                    for vs in (_node_vars(n, design, vars) for n in nodes) if vs)
+            ),
+            zero
         )
 
     pop_count = vars.init_var(node_filter, bv)
@@ -76,15 +88,15 @@ def init_popcount_concat(
         solver : Solver) -> Term:
 
     nodes = [n for n in cgra.all_nodes if node_filter(n)]
-    width = len(nodes).bit_length()
-    zero = solver.TheoryConst(solver.BitVec(width - 1), 0)
+    width = max(len(nodes).bit_length(), 2)
+    zero = vars.terms.bv_const(width - 1, 0)
     zeroExt = ft.partial(solver.Concat, zero)
     expr = ft.reduce(solver.BVAdd,
             map(zeroExt,
-                (ft.reduce(solver.BVOr,
-                    (vars[n, v] for v in design.values)
-                ) for n in nodes)
-            )
+                (vars.terms.bv_or(vs)
+                    for vs in (_node_vars(n, design, vars) for n in nodes) if vs)
+            ),
+            vars.terms.bv_const(width, 0)
         )
 
     pop_count = vars.init_var(node_filter, expr.sort)
@@ -127,7 +139,11 @@ def init_popcount_bithack(
 
 
     constraints = []
-    vs = [vars[n, v] for n in cgra.all_nodes if node_filter(n) for v in design.values]
+    vs = [v for n in cgra.all_nodes if node_filter(n) for v in _node_vars(n, design, vars)]
+    if not vs:
+        pop_count = vars.init_var(node_filter, solver.BitVec(1))
+        return pop_count == 0
+
     width = len(vs)
     # build a bitvector from the concanation of bits
     bv = vars.anonymous_var(solver.BitVec(width))
@@ -163,6 +179,72 @@ def init_popcount_bithack(
     return solver.And(constraints)
 
 
+def unary_count(terms : tp.Sequence[Term], solver : Solver) -> tp.List[Term]:
+    '''
+        totalizer over 1-bit terms, the k-th returned term (from 0) is set
+        iff at least k+1 of terms are set.  Only uses 1-bit operations.
+    '''
+    def _merge(a, b):
+        r = []
+        for k in range(1, len(a) + len(b) + 1):
+            ts = []
+            for i in range(max(0, k - len(b)), min(k, len(a)) + 1):
+                j = k - i
+                if i == 0:
+                    ts.append(b[j-1])
+                elif j == 0:
+                    ts.append(a[i-1])
+                else:
+                    ts.append(a[i-1] & b[j-1])
+            r.append(ft.reduce(solver.BVOr, ts))
+        return r
+
+    counts = [[t] for t in terms]
+    if not counts:
+        return []
+
+    while len(counts) > 1:
+        counts = [_merge(*counts[i:i+2]) if i + 1 < len(counts) else counts[i]
+                for i in range(0, len(counts), 2)]
+    return counts[0]
+
+@AutoPartial(1)
+def init_popcount_unary(
+        node_filter : NodeFilter,
+        cgra : MRRG,
+        design : Design,
+        vars : Modeler,
+        solver : Solver) -> Term:
+    '''
+        unary popcount (totalizer) of the used filtered nodes,
+        vars[node_filter, k] is set iff at least k filtered nodes are used.
+        Only uses 1-bit operations so it also works with the CNF backend.
+    '''
+    used = [vars.terms.bv_or(vs)
+            for vs in (_node_vars(n, design, vars) for n in cgra.all_nodes if node_filter(n)) if vs]
+    if not used:
+        return vars.terms.bool_const(True)
+
+    bv1 = solver.BitVec(1)
+    c = []
+    for k, t in enumerate(unary_count(used, solver), 1):
+        c.append(vars.init_var((node_filter, k), bv1) == t)
+    return solver.And(c)
+
+@AutoPartial(1)
+def soft_popcount(
+        node_filter : NodeFilter,
+        cgra : MRRG,
+        design : Design,
+        vars : Modeler,
+        solver : Solver) -> tp.List[Term]:
+    '''
+        one term per filtered node which is set iff the node is used,
+        minimizing the number of set terms minimizes the popcount
+    '''
+    return [vars.terms.bv_or(vs)
+            for vs in (_node_vars(n, design, vars) for n in cgra.all_nodes if node_filter(n)) if vs]
+
 # HACK OH GOD THE HACKINESS
 __pop_count = None
 @AutoPartial(1)
@@ -175,8 +257,7 @@ def init_popcount_shannon(
     nodes = []
     for node in cgra.all_nodes:
         if node_filter(node):
-            for value in design.values:
-                v = vars[node, value]
+            for v in _node_vars(node, design, vars):
                 v = ~v
                 nodes.append(v)
     it = iter(enumerate(nodes))
@@ -205,7 +286,7 @@ def count(
         design : Design,
         vars : Model) -> int:
 
-    s = sum(vars[node, value]
+    s = sum(vars.get((node, value), 0)
             for node in cgra.all_nodes
             for value in design.values
             if node_filter(node))
@@ -222,7 +303,7 @@ def smart_count(
 
     for pe in cgra.functional_units:
         for op in design.operations:
-            if vars[pe, op] == 1:
+            if vars.get((pe, op), 0) == 1:
                 F_map[op] = pe
     used = set()
     for op in design.operations:
@@ -231,49 +312,67 @@ def smart_count(
             for pe in F_map[op]:
                 for dst in value.dsts:
                     for _dst_node in F_map[dst[0]]:
-                        dst_node = _dst_node.operands[dst[1]]
+                        dst_node = operand_port(vars, _dst_node, dst)
                         for node in _get_path(vars, pe, value, dst, dst_node):
                             if node_filter(node):
                                 used.add(node)
     return len(used)
 
-@ft.lru_cache(maxsize=32)
+@ft.lru_cache(maxsize=None)
+def distance_table(
+        node_filter : NodeFilter,
+        cgra : MRRG) -> tp.Mapping[str, tp.Mapping[str, int]]:
+    '''
+        table[src_opcode][dst_opcode] is the least number of filtered
+        nodes on a route from a unit supporting src_opcode to another unit
+        supporting dst_opcode, missing if there is none.  The source is
+        counted twice and the destination not at all.
+
+        One multi-source search per source opcode which keeps the two
+        closest distinct sources of every node, so a unit which supports
+        both opcodes is not its own destination.  Cached per (node_filter,
+        cgra) and shared by all designs.
+    '''
+    weight = {n : 1 if node_filter(n) else 0 for n in cgra.all_nodes}
+    opcodes = set().union(*(pe.ops for pe in cgra.functional_units))
+    table = {}
+    for src_op_code in opcodes:
+        q = PriorityQueue()
+        for src_node in cgra.legal_units(src_op_code):
+            q[src_node, src_node] = weight[src_node]
+        labels = {}
+        best = {}
+        while q:
+            (node, src_node), d = q.popitem()
+            srcs = labels.setdefault(node, set())
+            if len(srcs) == 2 or src_node in srcs:
+                continue
+            srcs.add(src_node)
+            if isinstance(node, mrrg.FunctionalUnit) and node != src_node:
+                for dst_op_code in node.ops:
+                    best[dst_op_code] = min(best.get(dst_op_code, d), d)
+
+            next_d = d + weight[node]
+            for n in node.outputs.values():
+                if n == src_node:
+                    continue
+                srcs_ = labels.get(n, ())
+                if len(srcs_) == 2 or src_node in srcs_:
+                    continue
+                k = n, src_node
+                if k not in q or next_d < q[k]:
+                    q[k] = next_d
+        table[src_op_code] = best
+    return table
+
 def _calc_dist(
         node_filter : NodeFilter,
         cgra : MRRG,
-        design : Design,
-        src_op_code : str, 
+        src_op_code : str,
         dst_op_code : str) -> int:
-    #basically dijkstras
-    best = float('inf')
-    for src_node in cgra.functional_units:
-        if src_op_code in src_node.ops:
-            q = PriorityQueue()
-            dist = {}
-            d = 1 if node_filter(src_node) else 0
-            q[src_node] = d
-            dist[src_node] = d
-
-            while q:
-                node, d = q.popitem()
-                if best <= d:
-                    break
-
-                for n in node.outputs.values():
-                    next_d = d + (1 if node_filter(node) else 0)
-                    if best <= next_d:
-                        continue
-                    if n == src_node:
-                        continue
-
-                    if n not in dist or next_d < dist[n]:
-                        dist[n] = next_d
-                        q[n] = next_d
-                        if isinstance(n, mrrg.FunctionalUnit):
-                            if dst_op_code in n.ops and next_d < best:
-                                best = next_d
-    assert best < float('inf')
-    return best
+    dist = distance_table(node_filter, cgra).get(src_op_code, {}).get(dst_op_code)
+    assert dist is not None
+    return dist
 
 @AutoPartial(1)
 def lower_bound_popcount(
@@ -285,10 +384,71 @@ def lower_bound_popcount(
     for val in design.values:
         src_op_code = val.src.opcode
         dst_op_codes = {op.opcode for op,_ in val.dsts}
-        dist = max(_calc_dist(node_filter, cgra, design, src_op_code, dop) for dop in dst_op_codes)
+        dist = max(_calc_dist(node_filter, cgra, src_op_code, dop) for dop in dst_op_codes)
         s += dist
     return s
 
+@ft.lru_cache(maxsize=None)
+def private_costs(
+        node_filter : NodeFilter,
+        cgra : MRRG) -> tp.Mapping[mrrg.FU_Port, int]:
+    '''
+        for every operand port the least number of filtered nodes on a
+        route to it which can not lie on a route to any other port.  A node
+        is private to a port if all of its outputs are private to it.
+    '''
+    memo = {}
+    def private(node : Node) -> int:
+        if node not in memo:
+            memo[node] = 0 # cycles of private nodes can not be routed
+            preds = list(node.inputs.values())
+            if preds and all(
+                    not isinstance(n, mrrg.FunctionalUnit) and set(n.outputs.values()) == {node}
+                    for n in preds):
+                d = min(map(private, preds))
+            else:
+                d = 0
+            memo[node] = d + (1 if node_filter(node) else 0)
+        return memo[node]
+
+    return {port : private(port)
+            for pe in cgra.functional_units
+            for port in pe.operands.values()}
+
+@AutoPartial(1)
+def lower_bound_steiner(
+        node_filter : NodeFilter,
+        cgra : MRRG,
+        design : Design,) -> int:
+    '''
+        lower_bound_popcount strengthened for fan-out.  The route of a value
+        to its farthest destination is disjoint from the nodes private to
+        the ports of its other destinations (see private_costs).  Every
+        destination lands on a different port, so the destinations which
+        share a set of candidate ports are charged the cheapest ones.
+    '''
+    costs = private_costs(node_filter, cgra)
+    s = 0
+    sinks = {}
+    for val in design.values:
+        src_op_code = val.src.opcode
+        dsts = sorted(val.dsts, key=lambda d : (d[0].name, d[1]))
+        dists = [_calc_dist(node_filter, cgra, src_op_code, op.opcode) for op, _ in dsts]
+        far = max(range(len(dsts)), key=dists.__getitem__)
+        s += dists[far]
+        for i, (op, operand) in enumerate(dsts):
+            if i != far:
+                k = op.opcode, None if op.commute else operand
+                sinks[k] = sinks.get(k, 0) + 1
+
+    for (opcode, operand), n in sinks.items():
+        ports = [port
+                for pe in cgra.legal_units(opcode)
+                for i, port in pe.operands.items()
+                if operand is None and i in (0, 1) or i == operand]
+        s += sum(sorted(costs[port] for port in ports)[:n])
+    return s
+
 @AutoPartial(1, max_arg_len=30)
 def freaze_fus(
     model : Model,
@@ -300,7 +460,8 @@ def freaze_fus(
     c = []
     for pe in cgra.functional_units:
         for op in design.operations:
-            c.append(vars[pe, op] == model[pe, op])
+            if (pe, op) in vars:
+                c.append(vars[pe, op] == model[pe, op])
     return solver.And(c)
 
 @AutoPartial(1) #node_filter
@@ -346,6 +507,34 @@ def limit_popcount_shannon(
         return v == 1
 
 
+@AutoPartial(1)
+@AutoPartial(3)
+def limit_popcount_unary(
+        node_filter : NodeFilter,
+        l : int,
+        n : int,
+        cgra : MRRG,
+        design : Design,
+        vars : Modeler,
+        solver : Solver) -> Term:
+    c = []
+    if l > 0:
+        if (node_filter, l) not in vars:
+            return vars.terms.bool_const(False)
+        c.append(vars[node_filter, l] == 1)
+
+    if n is not None:
+        if n < 0 or n < l:
+            assert 0
+        elif (node_filter, n + 1) in vars:
+            c.append(vars[node_filter, n + 1] == 0)
+
+    if c:
+        return solver.And(c)
+    else:
+        return vars.terms.bool_const(True)
+
+
 def mux_filter(node : Node) -> bool:
     return isinstance(node, mrrg.Mux)
 
@@ -4,18 +4,45 @@ import typing as tp
 from collections import Counter
 from smt_switch import smt
 from modeler import Modeler
-from design import Design
+from design import Design, Operation, COMMUTATIVE_OPCODES
 from mrrg import MRRG
 import mrrg
 import smt_switch_types
+import constraints
 from constraints import ConstraintGeneratorType
-from modeler import Model, ModelReader
+from modeler import Model, ModelReader, ModelLog, namespace_of, PLACEMENT, ROUTING
+from cnf import CNFSolver, CNFTerm
+import formula_cache
 import optimization
 from util import Timer, NullTimer
 
 ConstraintGeneratorList = tp.Sequence[ConstraintGeneratorType]
 
 
+def _assumption_key(t : smt_switch_types.Term) -> tp.Hashable:
+    # == on CNFTerms builds a term, compare their literals instead
+    if isinstance(t, CNFTerm):
+        return t.lit
+    return t
+
+def _core_indices(
+        assumed : tp.Sequence[smt_switch_types.Term],
+        core : tp.Iterable[smt_switch_types.Term]) -> tp.Set[int]:
+    '''
+        positions in assumed of the terms in core, matched by term equality
+        as solvers may return new wrappers for the assumed terms
+    '''
+    index = {}
+    for i, a in enumerate(assumed):
+        index.setdefault(_assumption_key(a), []).append(i)
+    indices = set()
+    for c in core:
+        k = _assumption_key(c)
+        if k not in index:
+            raise ValueError(f'{c} is not an assumption')
+        indices.update(index[k])
+    return indices
+
 class PNR:
     _cgra : MRRG
     _design : Design
@@ -32,7 +59,9 @@ class PNR:
             seed : int = 0,
             incremental : bool = False,
             duplicate_const : bool = False,
-            duplicate_all : bool = False,):
+            duplicate_all : bool = False,
+            commute : bool = False,
+            solver_opts : tp.Sequence[tp.Tuple[str, tp.Any]] = (),):
 
 
 
@@ -44,21 +73,30 @@ class PNR:
                 if op.opcode == 'const':
                     op.allow_duplicate()
 
+        if commute:
+            for op in design.operations:
+                if op.opcode in COMMUTATIVE_OPCODES and set(op.inputs) == {0, 1}:
+                    op.allow_commute()
+
         self._cgra = cgra
         self._design  = design
         self._incremental = incremental
 
-        self._solver = solver = smt(solver_str)
-        self._solver_opts = solver_opts = [('random-seed', seed), ('produce-models', 'true')]
+        if solver_str == CNFSolver.solver_name:
+            self._solver = solver = CNFSolver()
+        else:
+            self._solver = solver = smt(solver_str)
+        self._solver_opts = opts = [('random-seed', seed), ('produce-models', 'true')]
         if incremental:
-            solver_opts.append(('incremental', 'true'))
+            opts.append(('incremental', 'true'))
 
         if solver_str == 'CVC4':
             if incremental:
-                solver_opts.append(('bv-sat-solver', 'cryptominisat'))
+                opts.append(('bv-sat-solver', 'cryptominisat'))
             else:
-                solver_opts.append(('bv-sat-solver', 'cadical'))
-                #solver_opts.append(('bitblast', 'eager'))
+                opts.append(('bv-sat-solver', 'cadical'))
+                #opts.append(('bitblast', 'eager'))
+        opts.extend(solver_opts)
 
         self._init_solver()
         self._vars  = Modeler(solver)
@@ -80,11 +118,27 @@ class PNR:
             return True
 
     def _reset(self) -> None:
-        self._vars.reset()
+        # the pinned constants of the modeler are built in the new solver
         self._solver.Reset()
+        self._vars.reset()
         self._init_solver()
         self._model = None
 
+    def _check_sat(self, assumed : tp.Sequence[smt_switch_types.Term] = ()) -> bool:
+        '''
+            every check of the solver goes through here, it invalidates the
+            modeler so lazy models of the previous check go stale
+        '''
+        self._vars.invalidate()
+        if assumed:
+            return self._solver.CheckSatAssuming(assumed)
+        return self._solver.CheckSat()
+
+    def _minimize(self, soft : tp.Sequence[smt_switch_types.Term]) -> tp.Optional[int]:
+        ''' like _check_sat for a native optimization call '''
+        self._vars.invalidate()
+        return self._solver.Minimize(soft)
+
     def _init_solver(self) -> None:
         solver = self._solver
 
@@ -98,11 +152,112 @@ class PNR:
             else:
                 self._solver._solver._btor.Set_sat_solver("CaDiCaL")
 
-    def pin_module(self, module, placement):
-        raise NotImplementedError()
+    def _find_op(self, module : tp.Union[str, Operation]) -> Operation:
+        for op in self.design.operations:
+            if op == module or op.name == module:
+                return op
+        raise KeyError(f'Unknown module: {module}')
+
+    def _find_node(self, node : tp.Union[str, mrrg.Node]) -> mrrg.Node:
+        for n in self.cgra.all_nodes:
+            if n == node or n.name == node:
+                return n
+        raise KeyError(f'Unknown node: {node}')
+
+    def _check_complete(self, init_funcs : ConstraintGeneratorList) -> None:
+        for f in init_funcs:
+            if constraints.is_window(f):
+                raise ValueError(f'{f.__qualname__} restricts routing, unsat results would be unsound.  Use solve_windowed')
+
+    def _check_unbuilt(self) -> None:
+        if any(self._vars.counts().values()):
+            raise ValueError('pins must be set before the constraints are built')
+
+    def pin_module(self,
+            module : tp.Union[str, Operation],
+            placement : tp.Union[str, mrrg.FunctionalUnit]) -> None:
+        '''
+            place module (an operation or its name) on placement (a
+            functional unit or its name).  The placement vars of the module
+            on other units (unless it may be duplicated) and of other
+            modules on the unit are removed.
+        '''
+        self._check_unbuilt()
+        op = self._find_op(module)
+        pe = self._find_node(placement)
+        if not isinstance(pe, mrrg.FunctionalUnit) or op.opcode not in pe.ops:
+            raise ValueError(f'{pe.name} does not support {op.name} ({op.opcode})')
 
-    def pin_tie(self, tie, placement):
-        raise NotImplementedError()
+        vars = self._vars
+        vars.pin((pe, op), 1)
+        if not op.duplicate:
+            for other in self.cgra.functional_units:
+                if other != pe:
+                    vars.pin((other, op), 0)
+        for other in self.design.operations:
+            if other != op:
+                vars.pin((pe, other), 0)
+
+    def pin_vars(self, pins : tp.Mapping[tp.Any, int]) -> None:
+        '''
+            apply pins taken from another PNR of the same fabric and design,
+            e.g. its pins property
+        '''
+        self._check_unbuilt()
+        for key, value in pins.items():
+            self._vars.pin(key, value)
+
+    def pin_tie(self,
+            tie : tp.Tuple[tp.Any, tp.Any, tp.Any],
+            placement : tp.Sequence[tp.Union[str, mrrg.Node]]) -> None:
+        '''
+            route tie, (src, dst, dst_port) with modules or their names as
+            in the design file, along placement: the nodes (or their names)
+            from the unit holding src to the operand port of dst (either
+            operand if dst may commute).  src is pinned to the first unit,
+            see pin_module.  The routing vars of the tie off the path and of
+            other values on the path are removed.
+        '''
+        self._check_unbuilt()
+        src, dst, port = tie
+        src = self._find_op(src)
+        dst = self._find_op(dst)
+        value = src.output
+        if value is None or (dst, port) not in value.dsts:
+            raise ValueError(f'No tie {src.name} -> {dst.name}.{port}')
+        d = dst, port
+
+        path = [self._find_node(n) for n in placement]
+        if not path or not isinstance(path[0], mrrg.FunctionalUnit):
+            raise ValueError('a routed tie starts at a functional unit')
+        for a, b in zip(path, path[1:]):
+            if a not in b.inputs.values():
+                raise ValueError(f'{a.name} does not drive {b.name}')
+
+        end = path[-1]
+        unit = end.output if isinstance(end, mrrg.FU_Port) else None
+        if not isinstance(unit, mrrg.FunctionalUnit) or dst.opcode not in unit.ops:
+            raise ValueError(f'a routed tie ends at an operand port of a unit supporting {dst.name} ({dst.opcode})')
+        ports = {unit.operands.get(port)}
+        if dst.commute and 0 in unit.operands and 1 in unit.operands:
+            ports.add(unit.operands[1 - port])
+        if end not in ports:
+            raise ValueError(f'{end.name} is not operand {port} of {unit.name}')
+
+        self.pin_module(src, path[0])
+        vars = self._vars
+        on_path = set(path)
+        for node in self.cgra.all_nodes:
+            if node in on_path:
+                vars.pin((node, value), 1)
+                vars.pin((node, value, d), 1)
+                for other in self.design.values:
+                    if other != value:
+                        vars.pin((node, other), 0)
+                        for od in other.dsts:
+                            vars.pin((node, other, od), 0)
+            else:
+                vars.pin((node, value, d), 0)
 
     def map_design(self,
             init_funcs : ConstraintGeneratorList,
@@ -117,10 +272,50 @@ class PNR:
                 c = f(*args)
                 print('done', flush=True)
                 solver.Assert(c)
+            print(self._vars.terms, flush=True)
         else:
             for f in it.chain(init_funcs, funcs):
                 solver.Assert(f(*args))
 
+    def map_design_cached(self,
+            cache : 'formula_cache.FormulaCache',
+            key : str,
+            init_funcs : ConstraintGeneratorList,
+            funcs : ConstraintGeneratorList,
+            verbose : bool = False) -> bool:
+        '''
+            map_design through an on-disk formula cache, returns True on a
+            hit.  Only the CNF backend can be cached and the formula is lost
+            on reset, so pass no generators to the optimizers afterwards and
+            use incremental mode.  Pins are folded into key.
+        '''
+        if not isinstance(self._solver, CNFSolver):
+            raise NotImplementedError('formula caching requires the CNF backend')
+        key = formula_cache.pinned_key(key, self._vars.pins)
+        if cache.load(key, self.cgra, self.design, self._solver, self._vars):
+            if verbose:
+                print('formula cache hit', flush=True)
+            return True
+        self.map_design(init_funcs, funcs, verbose)
+        cache.store(key, self._solver, self._vars)
+        return False
+
+    def dump(self, f : tp.TextIO, format : str = 'dimacs') -> None:
+        '''
+            write the current problem, including the bounds asserted by an
+            interrupted optimization, as 'dimacs' or 'smt2'.
+            Requires the CNF backend.
+        '''
+        solver = self._solver
+        if not isinstance(solver, CNFSolver):
+            raise NotImplementedError(f'{solver.solver_name} problems cannot be dumped, use the CNF backend')
+        if format == 'dimacs':
+            solver.write_dimacs(f)
+        elif format == 'smt2':
+            solver.write_smtlib2(f)
+        else:
+            raise ValueError(f'Unknown format: {format}')
+
     def satisfy_design(self,
             init_funcs : ConstraintGeneratorList,
             funcs : ConstraintGeneratorList,
@@ -130,7 +325,87 @@ class PNR:
             build_timer : tp.Optional[Timer] = None,
             solve_timer : tp.Optional[Timer] = None,
             ) -> bool:
-        pass
+        '''
+            feasibility check in stages which exits on the first UNSAT stage.
+
+            The placement generators (constraints.is_placement_stage) are
+            applied and checked first, then the routing generators in
+            chunks: with l of u routing generators applied the next check
+            is after first_cut(l, u) of them (default all).  In
+            non-incremental mode the solver is reset and every applied
+            stage rebuilt before each check.
+        '''
+        if not verbose:
+            log = lambda *args, **kwargs :  None
+        else:
+            log = ft.partial(print, sep='', flush=True)
+
+        self._check_complete(init_funcs)
+        if not self._check_pigeons():
+            log('Infeasible: too many pigeons')
+            return False
+
+        solver = self._solver
+        vars = self._vars
+        cgra = self.cgra
+        design = self.design
+        args = cgra, design, vars, solver
+        incremental = self._incremental
+
+        if attest_func is None:
+            attest_func : ModelReader = lambda *args : True
+
+        if first_cut is None:
+            first_cut = lambda l, u : u
+
+        if build_timer is None:
+            build_timer = NullTimer()
+
+        if solve_timer is None:
+            solve_timer = NullTimer()
+
+        gens = (*init_funcs, *funcs)
+        placement = [f for f in gens if constraints.is_placement_stage(f)]
+        routing = [f for f in gens if not constraints.is_placement_stage(f)]
+
+        stages = [placement]
+        l, u = 0, len(routing)
+        while l < u:
+            cut = first_cut(l, u)
+            assert l < cut <= u
+            stages.append(routing[l:cut])
+            l = cut
+
+        applied = []
+        for i, stage in enumerate(stages):
+            if incremental:
+                todo = stage
+            else:
+                self._reset()
+                todo = *applied, *stage
+            applied.extend(stage)
+
+            log(f'Stage {i}:')
+            build_timer.start()
+            for f in todo:
+                log('  ', f.__qualname__, end='... ')
+                solver.Assert(f(*args))
+                log('done')
+            build_timer.stop()
+
+            solve_timer.start()
+            s = self._check_sat()
+            solve_timer.stop()
+            if not s:
+                log('unsat')
+                if incremental:
+                    self._reset()
+                return False
+            log('sat')
+
+        self._model = vars.save_model()
+        attest_func(cgra, design, self._model)
+        return True
 
     def optimize_enum(self,
             optimizer : optimization.Optimizer,
@@ -143,12 +418,14 @@ class PNR:
             cutoff : tp.Optional[float] = None,
             return_bounds : bool = False,
             max_sol : int = 5000,
+            model_log : tp.Optional[ModelLog] = None,
             ) -> bool:
         if not verbose:
             log = lambda *args, **kwargs :  None
         else:
             log = ft.partial(print, sep='', flush=True)
 
+        self._check_complete(init_funcs)
         if not self._check_pigeons():
             log('Infeasible: too many pigeons')
             if return_bounds:
@@ -173,6 +450,11 @@ class PNR:
         if solve_timer is None:
             solve_timer = NullTimer()
 
+        if model_log is None:
+            log_model = lambda *args, **kwargs : None
+        else:
+            log_model = model_log.append
+
         if cutoff is None:
             def check_cutoff(lower, upper):
                 return False
@@ -204,7 +486,7 @@ class PNR:
 
         def do_checksat():
             solve_timer.start()
-            s = solver.CheckSat()
+            s = self._check_sat()
             solve_timer.stop()
             return s
 
@@ -213,9 +495,9 @@ class PNR:
             solver = vars._solver
             kx = []
             tx = []
-            for k,v in model.items():
-                n = k[0]
-                if v == 1 and len(k) == 2 and optimizer.node_filter(n):
+            # only read the node keys, model may be lazy
+            for k in model:
+                if len(k) == 2 and optimizer.node_filter(k[0]) and model[k] == 1:
                     kx.append(k)
             assert kx
             c = []
@@ -244,6 +526,7 @@ class PNR:
             sol = 1
             best = m = vars.save_model()
             upper = eval_func(cgra, design, best)
+            log_model(best, eval=upper)
             if check_cutoff(lower, upper):
                 lower = lower_func(cgra, design)
 
@@ -251,6 +534,11 @@ class PNR:
 
             log(f'bounds: [{lower}, {upper}])')
 
+            # what eval_func and not_this read, in one bulk read per solution
+            read_keys = [k for k in vars
+                    if namespace_of(k) == PLACEMENT
+                    or namespace_of(k) == ROUTING and optimizer.node_filter(k[0])]
+
             while check_cutoff(lower, upper) \
                 and solve_timer.times[-1] + build_timer.times[-1] <= init_time \
                 and solve_timer.total + build_timer.total < init_time * 100:
@@ -258,12 +546,15 @@ class PNR:
                 not_this(m, vars)
 
                 if do_checksat():
-                    m = vars.save_model()
+                    # most solutions are discarded so only read what is needed
+                    m = vars.lazy_model()
+                    m.prefetch(read_keys)
                     e = eval_func(cgra, design, m)
                     if upper > e:
                         log(f'\nnew model eval: {e}')
                         upper = e
-                        best = m
+                        best = m = m.materialize()
+                        log_model(best, eval=upper)
                     elif upper == e:
                         log('=', end='')
                     else:
@@ -299,13 +590,39 @@ class PNR:
             cutoff : tp.Optional[float] = None,
             return_bounds : bool = False,
             optimize_final : bool = False,
+            assumptions : bool = False,
+            core_guided : bool = False,
+            share_bounds : tp.Optional[tp.Callable[[int, int], tp.Tuple[int, int]]] = None,
+            model_log : tp.Optional[ModelLog] = None,
             ) -> bool:
+        '''
+            binary search on the optimizer's objective.
+
+            With assumptions each bound is guarded by a fresh selector
+            which is passed to CheckSatAssuming and retired afterwards, so
+            the formula is never rebuilt or popped and learned clauses are
+            kept across probes.  Requires incremental mode.
+
+            With core_guided each probe is followed by an OLL step over the
+            optimizer's soft indicators: all indicators are assumed unset,
+            every unsat core raises the lower bound by one and is relaxed
+            with a totalizer.  If the indicators become satisfiable the
+            model is optimal.  Requires incremental mode and soft_wrapper.
+
+            share_bounds is called with the local (lower, upper) after every
+            probe and returns the global bounds, probes then aim below the
+            global upper bound.  Sharing stops once the placement is frozen
+            as the bounds of the frozen problem are local.
+
+            Every improving model is appended to model_log.
+        '''
 
         if not verbose:
             log = lambda *args, **kwargs :  None
         else:
             log = ft.partial(print, sep='', flush=True)
 
+        self._check_complete(init_funcs)
         if not self._check_pigeons():
             log('Infeasible: too many pigeons')
             if return_bounds:
@@ -333,6 +650,11 @@ class PNR:
         if solve_timer is None:
             solve_timer = NullTimer()
 
+        if model_log is None:
+            log_model = lambda *args, **kwargs : None
+        else:
+            log_model = model_log.append
+
         if cutoff is None:
             def check_cutoff(lower, upper):
                 return False
@@ -344,7 +666,18 @@ class PNR:
                 return (upper - lower)/upper > cutoff
 
 
-        if incremental:
+        if assumptions:
+            if not incremental:
+                raise ValueError('assumptions require incremental mode')
+            if not hasattr(solver, 'CheckSatAssuming'):
+                raise NotImplementedError(f'{solver.solver_name} does not support CheckSatAssuming')
+
+            selectors = []
+            def retire():
+                while selectors:
+                    solver.Assert(selectors.pop() == 0)
+            sat_cb = unsat_cb = retire
+        elif incremental:
             sat_cb = solver.Push
             def unsat_cb():
                 solver.Pop()
@@ -353,6 +686,53 @@ class PNR:
             sat_cb = self._reset
             unsat_cb = self._reset
 
+        if core_guided:
+            if not incremental:
+                raise ValueError('core guided bounds require incremental mode')
+            if optimizer.soft_func is None:
+                raise ValueError('core guided bounds require a soft_wrapper')
+            if not hasattr(solver, 'GetUnsatAssumptions'):
+                raise NotImplementedError(f'{solver.solver_name} does not support GetUnsatAssumptions')
+
+            # (term, counts, k) with term == counts[k-1], i.e. term is set iff
+            # at least k of the relaxed core are set, counts is None for the
+            # original soft indicators
+            soft : tp.List[tp.Tuple[smt_switch_types.Term, tp.Optional[tp.List[smt_switch_types.Term]], int]] = []
+            core_lower = 0
+
+        def refine() -> tp.Optional[Model]:
+            ''' one OLL step, returns a model if all soft indicators can be unset '''
+            nonlocal soft, core_lower
+            if not soft and not core_lower:
+                build_timer.start()
+                soft = [(t, None, 1) for t in optimizer.soft_func(*args)]
+                build_timer.stop()
+
+            assumed = [t == 0 for t, _, _ in soft]
+            log('Refining lower bound: ', len(assumed), ' soft indicators')
+            solve_timer.start()
+            s = self._check_sat(assumed)
+            solve_timer.stop()
+            if s:
+                log('sat')
+                return vars.save_model()
+
+            core = _core_indices(assumed, solver.GetUnsatAssumptions())
+            log('core of size ', len(core))
+            assert core, 'current bounds exclude every model'
+            core_lower += 1
+            build_timer.start()
+            relaxed = [e for i, e in enumerate(soft) if i in core]
+            soft = [e for i, e in enumerate(soft) if i not in core]
+            for _, counts, k in relaxed:
+                if counts is not None and k < len(counts):
+                    soft.append((counts[k], counts, k+1))
+            if len(relaxed) > 1:
+                counts = optimization.unary_count([t for t, _, _ in relaxed], solver)
+                soft.append((counts[1], counts, 2))
+            build_timer.stop()
+            return None
+
         def apply(*funcs : ConstraintGeneratorType) -> tp.List[smt_switch_types.Term]:
             log('Building constraints:')
             build_timer.start()
@@ -363,9 +743,19 @@ class PNR:
             build_timer.stop()
             log('---\n')
 
-        def do_checksat():
+        def apply_guarded(f : ConstraintGeneratorType) -> smt_switch_types.Term:
+            ''' assert f under a fresh selector and return the assumption enabling it '''
+            log('Building guarded constraint: ', f.__qualname__)
+            build_timer.start()
+            sel = vars.anonymous_var(solver.BitVec(1))
+            solver.Assert(solver.Or(sel == 0, f(*args)))
+            selectors.append(sel)
+            build_timer.stop()
+            return sel == 1
+
+        def do_checksat(*assumed : smt_switch_types.Term):
             solve_timer.start()
-            s = solver.CheckSat()
+            s = self._check_sat(assumed)
             solve_timer.stop()
             if s:
                 log('sat')
@@ -373,6 +763,15 @@ class PNR:
                 log('unsat')
             return s
 
+        if share_bounds is None:
+            share_bounds = lambda lower, upper : (lower, upper)
+
+        def exchange(lower, upper):
+            ''' publish the local bounds and return the bounds to search between '''
+            l, u = share_bounds(lower, upper)
+            goal = min(upper, u)
+            return min(max(lower, l), goal), goal
+
         eval_func = optimizer.eval_func
         limit_func = optimizer.limit_func
         lower_func = optimizer.lower_func
@@ -392,18 +791,23 @@ class PNR:
             lower = 0
             best = vars.save_model()
             upper = eval_func(cgra, design, best)
+            log_model(best, eval=upper)
             if check_cutoff(lower, upper) or optimize_final:
                 lower = lower_func(cgra, design)
-            next = first_cut(lower, upper)
+            lower, goal = exchange(lower, upper)
+            next = first_cut(lower, goal)
             attest_func(cgra, design, best)
             sat_cb()
 
             next_f = None
 
-            if not check_cutoff(lower, upper) and optimize_final:
+            if not check_cutoff(lower, goal) and optimize_final:
                 optimize_final = False
                 def check_cutoff(lower, upper):
                     return lower < upper
+                exchange = lambda lower, upper : (lower, upper)
+                goal = upper
+                next = first_cut(lower, goal)
 
                 log('freazing placement')
                 if incremental:
@@ -411,32 +815,55 @@ class PNR:
                 else:
                     funcs = *funcs, optimization.freaze_fus(best)
 
-            while check_cutoff(lower, upper):
-                assert lower <= next <= upper
-                log(f'bounds: [{lower}, {upper}])')
+            while check_cutoff(lower, goal):
+                assert lower <= next <= goal
+                log(f'bounds: [{lower}, {goal}])')
                 log(f'next: {next}\n')
 
                 f = limit_func(lower, next)
-                if next_f is None:
+                if assumptions:
+                    if next_f is not None:
+                        apply(next_f)
+                    s = do_checksat(apply_guarded(f))
+                elif next_f is None:
                     apply(*funcs, f)
+                    s = do_checksat()
                 else:
                     apply(*funcs, next_f, f)
+                    s = do_checksat()
 
-                if do_checksat():
+                if s:
                     best = vars.save_model()
                     upper = eval_func(cgra, design, best)
+                    log_model(best, eval=upper)
                     attest_func(cgra, design, best)
                     sat_cb()
                 else:
                     lower = next+1
                     unsat_cb()
-                next = int((upper+lower)/2)
+
+                if core_guided and check_cutoff(lower, min(upper, goal)):
+                    m = refine()
+                    if m is not None:
+                        best = m
+                        upper = eval_func(cgra, design, best)
+                        log_model(best, eval=upper)
+                        attest_func(cgra, design, best)
+                        lower = upper
+                        core_guided = False
+                    else:
+                        lower = min(max(lower, core_lower), upper)
+                lower, goal = exchange(lower, upper)
+                next = int((goal+lower)/2)
 
                 next_f = None
-                if not check_cutoff(lower, upper) and optimize_final:
+                if not check_cutoff(lower, goal) and optimize_final:
                     optimize_final = False
                     def check_cutoff(lower, upper):
                         return lower < upper
+                    exchange = lambda lower, upper : (lower, upper)
+                    goal = upper
+                    next = int((goal+lower)/2)
 
                     log('freazing placement')
                     if incremental:
@@ -457,6 +884,87 @@ class PNR:
             else:
                 return False
 
+    def optimize_native(self,
+            optimizer : optimization.Optimizer,
+            init_funcs : ConstraintGeneratorList,
+            funcs : ConstraintGeneratorList,
+            verbose : bool = False,
+            attest_func : tp.Optional[ModelReader] = None,
+            build_timer : tp.Optional[Timer] = None,
+            solve_timer : tp.Optional[Timer] = None,
+            return_bounds : bool = False,
+            ) -> bool:
+        '''
+            hand the objective to the solver in a single call instead of
+            binary searching on it.  optimizer.soft_func gives the terms to
+            minimize, the solver must provide Minimize (MaxSAT/OMT), e.g.
+            the CNF backend.
+        '''
+        if not verbose:
+            log = lambda *args, **kwargs :  None
+        else:
+            log = ft.partial(print, sep='', flush=True)
+
+        self._check_complete(init_funcs)
+        if not self._check_pigeons():
+            log('Infeasible: too many pigeons')
+            if return_bounds:
+                return (False, None, None)
+            else:
+                return False
+
+        solver = self._solver
+        vars = self._vars
+        cgra = self.cgra
+        design = self.design
+        args = cgra, design, vars, solver
+
+        if optimizer.soft_func is None:
+            raise ValueError('optimizer has no soft_func')
+
+        if not hasattr(solver, 'Minimize'):
+            raise NotImplementedError(f'{solver.solver_name} does not support native optimization')
+
+        if attest_func is None:
+            attest_func : ModelReader = lambda *args : True
+
+        if build_timer is None:
+            build_timer = NullTimer()
+
+        if solve_timer is None:
+            solve_timer = NullTimer()
+
+        log('Building constraints:')
+        build_timer.start()
+        for f in it.chain(init_funcs, funcs):
+            log('  ', f.__qualname__, end='... ')
+            solver.Assert(f(*args))
+            log('done')
+        soft = optimizer.soft_func(*args)
+        build_timer.stop()
+        log('---\n')
+
+        solve_timer.start()
+        cost = self._minimize(soft)
+        solve_timer.stop()
+
+        if cost is None:
+            log('unsat')
+            if return_bounds:
+                return (False, None, None)
+            else:
+                return False
+
+        best = vars.save_model()
+        upper = optimizer.eval_func(cgra, design, best)
+        attest_func(cgra, design, best)
+        self._model = best
+        log(f'optimal found: {upper}')
+        if return_bounds:
+            return (True, min(cost, upper), upper)
+        else:
+            return True
+
     def solve(self, *, verbose : bool = False):
         if not self._check_pigeons():
             if verbose:
@@ -466,7 +974,7 @@ class PNR:
         if verbose:
             print('Solving ...', flush=True)
 
-        if not solver.CheckSat():
+        if not self._check_sat():
             solver.Reset()
             self._init_solver()
             return False
@@ -474,6 +982,38 @@ class PNR:
         self._model = self._vars.save_model()
         return True
 
+    def solve_windowed(self,
+            init_funcs : ConstraintGeneratorList,
+            funcs : ConstraintGeneratorList,
+            slack : int = 0,
+            max_slack : tp.Optional[int] = None,
+            verbose : bool = False) -> bool:
+        '''
+            map and solve with routing vars restricted to windows of the
+            shortest path length + slack.  The slack is widened each time
+            the restricted problem is unsat until it exceeds max_slack, at
+            which point routing is only restricted by reachability.
+            max_slack defaults to the number of nodes in the MRRG.
+
+            init_funcs should not declare routing vars.
+        '''
+        if max_slack is None:
+            max_slack = len(self.cgra.all_nodes)
+
+        while True:
+            if slack > max_slack:
+                slack = None
+            if verbose:
+                print(f'Routing slack: {slack}', flush=True)
+
+            self._reset()
+            self.map_design((*init_funcs, constraints.init_routing_vars_window(slack)), funcs, verbose)
+            if self.solve(verbose=verbose):
+                return True
+            elif slack is None or not self._check_pigeons():
+                return False
+            slack = 2*slack + 1
+
     def attest_design(self, *funcs : ModelReader, verbose : bool = False):
         model = self._model
         assert model is not None
@@ -496,3 +1036,12 @@ class PNR:
     def design(self) -> Design:
         return self._design
 
+
+    @property
+    def pins(self) -> tp.Mapping[tp.Any, int]:
+        ''' keys fixed by pin_module and pin_tie '''
+        return self._vars.pins
+
+    @property
+    def model(self) -> tp.Optional[Model]:
+        return self._model
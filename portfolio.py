@@ -0,0 +1,207 @@
+'''
+    Run several PNR configurations on the same problem in parallel processes,
+    the first worker to answer wins and the rest are terminated.
+
+    Workers are forked so the MRRG, design, constraint generators and
+    optimizer are shared without pickling, models are sent back with
+    modeler.encode_model.  Optimizing workers publish their bounds to a
+    SharedBounds so each binary search aims below the global best.
+'''
+import itertools as it
+import multiprocessing as mp
+from multiprocessing import connection
+import time
+import typing as tp
+
+import constraints
+import modeler
+import optimization
+from constraints import ConstraintGeneratorType
+from design import Design
+from modeler import Model
+from mrrg import MRRG
+from pnr import PNR
+
+ConstraintGeneratorList = tp.Sequence[ConstraintGeneratorType]
+
+class WorkerConfig(tp.NamedTuple):
+    solver : str = 'Boolector'
+    seed : int = 0
+    # None keeps the encodings bound in the constraint generators
+    encoding : tp.Optional[str] = None
+    incremental : bool = False
+    solver_opts : tp.Tuple[tp.Tuple[str, tp.Any], ...] = ()
+
+class Result(tp.NamedTuple):
+    config : WorkerConfig
+    sat : bool
+    lower : tp.Optional[int]
+    upper : tp.Optional[int]
+    model : tp.Optional[Model]
+
+class SharedBounds:
+    '''
+        global (lower, upper) of cooperating optimize_design calls,
+        exchange is passed as their share_bounds
+    '''
+    def __init__(self, ctx = mp):
+        self._bounds = ctx.Array('q', [0, 2**62])
+
+    def exchange(self, lower : int, upper : int) -> tp.Tuple[int, int]:
+        bounds = self._bounds
+        with bounds.get_lock():
+            bounds[0] = max(bounds[0], lower)
+            bounds[1] = min(bounds[1], upper)
+            return bounds[0], bounds[1]
+
+    @property
+    def lower(self) -> int:
+        return self._bounds[0]
+
+    @property
+    def upper(self) -> int:
+        return self._bounds[1]
+
+def make_configs(
+        n : int,
+        solvers : tp.Sequence[str] = ('Boolector',),
+        encodings : tp.Sequence[tp.Optional[str]] = (None,),
+        incremental : bool = False,
+        seed : int = 0,
+        ) -> tp.List[WorkerConfig]:
+    ''' n configs cycling through solvers x encodings, each with its own seed '''
+    combos = it.cycle(it.product(solvers, encodings))
+    return [WorkerConfig(s, seed + i, e, incremental)
+            for i, (s, e) in zip(range(n), combos)]
+
+def _worker(
+        index : int,
+        config : WorkerConfig,
+        cgra : MRRG,
+        design : Design,
+        init_funcs : ConstraintGeneratorList,
+        funcs : ConstraintGeneratorList,
+        optimizer : tp.Optional[optimization.Optimizer],
+        kwargs : tp.Mapping[str, tp.Any],
+        pins : tp.Mapping[tp.Any, int],
+        results : mp.Queue) -> None:
+    try:
+        pnr = PNR(cgra, design, config.solver, config.seed, config.incremental,
+                solver_opts=config.solver_opts)
+        pnr.pin_vars(pins)
+        if config.encoding is not None:
+            funcs = constraints.set_encodings(funcs, config.encoding)
+
+        if optimizer is None:
+            pnr.map_design(init_funcs, funcs)
+            sat = pnr.solve()
+            lower = upper = None
+        else:
+            sat, lower, upper = pnr.optimize_design(optimizer, init_funcs, funcs,
+                    return_bounds=True, **kwargs)
+
+        model = modeler.encode_model(pnr.model) if sat else None
+        results.put((index, Result(config, sat, lower, upper, model)))
+    except Exception as e:
+        results.put((index, f'{type(e).__name__}: {e}'))
+
+def run_portfolio(
+        cgra : MRRG,
+        design : Design,
+        configs : tp.Sequence[WorkerConfig],
+        init_funcs : ConstraintGeneratorList,
+        funcs : ConstraintGeneratorList,
+        optimizer : tp.Optional[optimization.Optimizer] = None,
+        timeout : tp.Optional[float] = None,
+        verbose : bool = False,
+        share : bool = True,
+        pins : tp.Optional[tp.Mapping[tp.Any, int]] = None,
+        **kwargs) -> tp.Optional[Result]:
+    '''
+        solve (or optimize if optimizer is given, kwargs are passed to
+        optimize_design) with one process per config.  Returns the result
+        of the first worker to finish or None if every worker failed (or
+        died without reporting) or the timeout expired.  pins (e.g. PNR.pins of the driver) are
+        applied in every worker.
+
+        With share the optimizing workers exchange bounds, a worker may then
+        stop once the global gap is closed without holding the best model,
+        so the first worker to finish whose upper bound is the global one
+        wins (or the best result once every worker is done).
+    '''
+    if not verbose:
+        log = lambda *args, **kwargs :  None
+    else:
+        log = lambda *args, **kwargs : print(*args, **kwargs, flush=True)
+
+    if pins is None:
+        pins = {}
+
+    ctx = mp.get_context('fork')
+    results = ctx.Queue()
+    bounds = None
+    if optimizer is not None and share:
+        bounds = SharedBounds(ctx)
+        kwargs = dict(kwargs, share_bounds=bounds.exchange)
+
+    procs = [ctx.Process(
+                target=_worker,
+                args=(i, c, cgra, design, init_funcs, funcs, optimizer, kwargs, pins, results),
+                daemon=True,
+            ) for i, c in enumerate(configs)]
+
+    for p in procs:
+        p.start()
+    log(f'started {len(procs)} workers')
+
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+
+    result = None
+    # workers which have not reported yet
+    pending = set(range(len(procs)))
+    try:
+        while pending:
+            if timeout is None:
+                remaining = None
+            else:
+                remaining = max(0, deadline - time.monotonic())
+            # a worker killed by a signal or os._exit never reports, so wait
+            # on the processes as well as on the queue
+            ready = connection.wait([results._reader, *(procs[i].sentinel for i in pending)], remaining)
+            if not ready:
+                log('portfolio timed out')
+                break
+
+            # results are flushed before a worker exits, so an empty queue
+            # means the exited workers died without one
+            if not results._reader.poll():
+                for i in sorted(pending):
+                    if procs[i].exitcode is not None:
+                        log(f'worker {i} {configs[i]} died: exit code {procs[i].exitcode}')
+                        pending.discard(i)
+                continue
+
+            index, r = results.get()
+            pending.discard(index)
+            if isinstance(r, str):
+                log(f'worker {index} {configs[index]} failed: {r}')
+                continue
+
+            log(f'worker {index} {configs[index]} finished: sat={r.sat} bounds=[{r.lower}, {r.upper}]')
+            if result is None or (r.sat and (not result.sat or r.upper < result.upper)):
+                result = r
+            if bounds is None or not r.sat or r.upper <= bounds.upper:
+                break
+    finally:
+        for p in procs:
+            if p.is_alive():
+                p.terminate()
+        for p in procs:
+            p.join()
+
+    if result is not None and result.sat:
+        result = result._replace(model=modeler.decode_model(cgra, design, result.model))
+        if bounds is not None:
+            result = result._replace(lower=min(max(result.lower, bounds.lower), result.upper))
+    return result
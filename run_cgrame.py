@@ -3,25 +3,71 @@
 
 import sys
 import argparse
+import contextlib
 import time
 
+import constraints
+
 parser = argparse.ArgumentParser(description='Run place and route')
 parser.add_argument('design', metavar='<DESIGN_FILE>', help='dot file')
 parser.add_argument('fabric', metavar='<FABRIC_FILE>', help='XML Fabric file')
 parser.add_argument('--contexts', help='Number of contexts', type=int, default=1)
 parser.add_argument('--verbose', '-v', help='print debug information', action='store_true', default=False)
 parser.add_argument('--seed', help='Seed the randomness in solvers', type=int, default=0)
-parser.add_argument('--solver', help='choose the smt solver to use for placement', default='Boolector')
+parser.add_argument('--solver', help='choose the smt solver to use for placement, CNF selects the pure SAT backend', default='Boolector')
 parser.add_argument('--time', '-t', action='store_true', help='Print timing information.', default=False)
 parser.add_argument('--parse-only', action='store_true', default=False, dest='parse_only')
 parser.add_argument('--rewrite-fabric', default=None, dest='rewrite_name')
 parser.add_argument('--optimize', '-o', action='store_true', default=False)
 parser.add_argument('--incremental', '-i', action='store_true', default=False)
+parser.add_argument('--assumptions', action='store_true', default=False, help='guard optimization bounds with assumption literals, requires --incremental')
+parser.add_argument('--core-guided', action='store_true', default=False, dest='core_guided', help='raise the lower bound from unsat cores, requires --incremental')
 parser.add_argument('--cutoff', type=float, default=None)
 parser.add_argument('--no-tie-nodes', action='store_true', default=False, dest='ntiesnodes')
+parser.add_argument('--sparse', action='store_true', default=False, help='only declare placement variables for legal (pe, op) pairs')
+parser.add_argument('--prune', action='store_true', default=False, help='only declare routing variables which can lie on a legal route')
+parser.add_argument('--slack', type=int, default=None, help='restrict routes to at most SLACK hops longer than the shortest path, widened on UNSAT, not supported with --optimize, --staged or --portfolio')
+parser.add_argument('--max-slack', type=int, default=None, dest='max_slack')
+parser.add_argument('--commute', action='store_true', default=False, help='let commutative ops take their operands on either port')
+parser.add_argument('--symmetry', action='store_true', default=False, help='break symmetries of the fabric and the design')
+parser.add_argument('--native', action='store_true', default=False, help='optimize with a single MaxSAT/OMT solver call, requires --solver CNF')
+parser.add_argument('--unary', action='store_true', default=False, help='use a unary popcount when optimizing, required by --solver CNF')
+parser.add_argument('--encoding', default=constraints.DEFAULT_ENCODING, choices=constraints.ENCODINGS, help='one-hot encoding')
+parser.add_argument('--portfolio', type=int, default=0, metavar='N', help='run N workers in parallel, the first to finish wins')
+parser.add_argument('--portfolio-solver', action='append', default=[], dest='portfolio_solvers', metavar='SOLVER',
+        help='solver for portfolio workers, may be repeated, defaults to --solver')
+parser.add_argument('--portfolio-encoding', action='append', default=[], dest='portfolio_encodings', choices=constraints.ENCODINGS,
+        help='one-hot encoding for portfolio workers, may be repeated, defaults to --encoding')
+parser.add_argument('--no-share-bounds', action='store_false', default=True, dest='share_bounds', help='do not exchange optimization bounds between portfolio workers')
+parser.add_argument('--log-models', default=None, dest='log_models', metavar='FILE', help='stream every improving model to FILE as JSON lines, not supported with --portfolio or --native')
+parser.add_argument('--pin', action='append', default=[], metavar='MODULE=UNIT', help='place MODULE on the functional unit UNIT, may be repeated')
+parser.add_argument('--pin-tie', action='append', default=[], dest='pin_tie', metavar='SRC,DST,OPERAND=NODE,...',
+        help='route a tie along the named nodes, may be repeated')
+parser.add_argument('--staged', action='store_true', default=False, help='check placement before building the routing constraints')
+parser.add_argument('--dump', default=None, metavar='FILE', help='write the feasibility problem to FILE (SMT-LIB2 if it ends in .smt2, else DIMACS) instead of solving, requires --solver CNF, not supported with --optimize or --portfolio')
+parser.add_argument('--external', default=None, metavar='COMMAND', help='solve with a command line solver run on a problem file, requires --solver CNF.  External solvers give no unsat cores, so not supported with --core-guided')
+parser.add_argument('--external-format', default='dimacs', choices=('dimacs', 'smt2'), dest='external_format')
+parser.add_argument('--external-timeout', type=float, default=None, dest='external_timeout', metavar='SECONDS')
+parser.add_argument('--encoding-for', action='append', default=[], dest='encoding_for', metavar='GENERATOR=ENCODING',
+        help='one-hot encoding for a single constraint generator, may be repeated')
 
 
 args = parser.parse_args()
+if args.slack is not None and (args.optimize or args.staged or args.portfolio):
+    parser.error('--slack can not be used with --optimize, --staged or --portfolio, unsat results in the window are not bounds')
+if args.log_models is not None and (args.portfolio or args.native):
+    parser.error('--log-models can not be used with --portfolio or --native')
+if args.dump is not None and (args.optimize or args.native or args.portfolio):
+    parser.error('--dump can not be used with --optimize, --native or --portfolio, only the feasibility problem is dumped')
+if args.external is not None and args.core_guided:
+    parser.error('--external can not be used with --core-guided, external solvers give no unsat cores')
+one_hot = {f.__name__ for f in constraints.ONE_HOT_GENERATORS}
+for e in args.encoding_for:
+    name, _, encoding = e.partition('=')
+    if name not in one_hot:
+        parser.error(f'--encoding-for: {name} does not take an encoding, choose from {", ".join(sorted(one_hot))}')
+    if encoding not in constraints.ENCODINGS:
+        parser.error(f'--encoding-for: invalid encoding {encoding!r}, choose from {", ".join(constraints.ENCODINGS)}')
 
 design_file = args.design
 fabric_file = args.fabric
@@ -31,25 +77,63 @@ from design import Design
 from adlparse import adlparse
 from mrrg import MRRG
 from pnr import PNR
-import constraints
 import optimization
 import modeler
+import portfolio
 from util import Timer
 
 mods, ties = dotparse.dot2graph(design_file)
 design = Design(mods, ties)
 cgra = adlparse(fabric_file, rewrite_name=args.rewrite_name)
 mrrg = MRRG(cgra, contexts=args.contexts, add_tie_nodes=not args.ntiesnodes)
-pnr = PNR(mrrg, design, args.solver, args.seed, args.incremental)
+solver_opts = []
+if args.external is not None:
+    solver_opts.append(('external-solver', args.external))
+    solver_opts.append(('external-format', args.external_format))
+    if args.external_timeout is not None:
+        solver_opts.append(('external-timeout', args.external_timeout))
+pnr = PNR(mrrg, design, args.solver, args.seed, args.incremental, commute=args.commute, solver_opts=solver_opts)
+
+for pin in args.pin:
+    module, _, unit = pin.partition('=')
+    if not module or not unit:
+        parser.error(f'--pin: expected MODULE=UNIT, got {pin!r}')
+    try:
+        pnr.pin_module(module, unit)
+    except (KeyError, ValueError) as e:
+        parser.error(f'--pin {pin}: {e.args[0]}')
+
+for pin in args.pin_tie:
+    tie, _, path = pin.partition('=')
+    tie = tie.split(',')
+    if len(tie) != 3 or not tie[2].isdigit() or not path:
+        parser.error(f'--pin-tie: expected SRC,DST,OPERAND=NODE,..., got {pin!r}')
+    src, dst, operand = tie
+    try:
+        pnr.pin_tie((src, dst, int(operand)), path.split(','))
+    except (KeyError, ValueError) as e:
+        parser.error(f'--pin-tie {pin}: {e.args[0]}')
 
 if args.parse_only:
     print('success')
     sys.exit(0)
 verbose = args.verbose
 
+if args.sparse:
+    init_placement = constraints.init_placement_vars_sparse
+else:
+    init_placement = constraints.init_placement_vars
+
+if args.slack is not None:
+    init_routing = constraints.init_routing_vars_window(args.slack)
+elif args.prune:
+    init_routing = constraints.init_routing_vars_pruned
+else:
+    init_routing = constraints.init_routing_vars
+
 init  = (
-        constraints.init_placement_vars,
-        constraints.init_routing_vars,
+        init_placement,
+        init_routing,
     )
 
 funcs = (
@@ -64,6 +148,31 @@ funcs = (
         constraints.routing_resource_usage,
     )
 
+funcs = constraints.set_encodings(funcs, args.encoding, dict(e.split('=') for e in args.encoding_for))
+if args.symmetry:
+    funcs += (constraints.fabric_symmetry, constraints.design_symmetry)
+
+if args.dump is not None:
+    pnr.map_design(init, funcs, verbose=verbose)
+    with open(args.dump, 'w') as f:
+        pnr.dump(f, 'smt2' if args.dump.endswith('.smt2') else 'dimacs')
+    print('dumped')
+    sys.exit(0)
+
+if args.portfolio:
+    configs = portfolio.make_configs(
+            args.portfolio,
+            args.portfolio_solvers or [args.solver],
+            args.portfolio_encodings or [None],
+            args.incremental,
+            args.seed)
+
+def portfolio_attest(result, *funcs):
+    for f in funcs:
+        if verbose:
+            print(f.__qualname__, flush=True)
+        f(mrrg, design, result.model)
+
 if args.optimize:
     #filter_func = optimization.route_filter
     #filter_func = optimization.mux_filter
@@ -72,26 +181,74 @@ if args.optimize:
     solve_timer = Timer(time.perf_counter)
     build_timer = Timer(time.perf_counter)
     opt_start = time.perf_counter()
+    if args.unary:
+        init_popcount = optimization.init_popcount_unary
+        limit_popcount = optimization.limit_popcount_unary
+    else:
+        init_popcount = optimization.init_popcount_bithack
+#        init_popcount = optimization.init_popcount_concat
+        limit_popcount = optimization.limit_popcount_total
     optimizer = optimization.Optimizer(filter_func,
-            optimization.init_popcount_bithack,
-#            optimization.init_popcount_concat,
+            init_popcount,
             optimization.smart_count,
-            optimization.lower_bound_popcount,
-            optimization.limit_popcount_total)
-    sat = pnr.optimize_design(
-#    sat = pnr.optimize_enum(
-            optimizer,
-            init,
-            funcs,
-            verbose=verbose,
-            attest_func=modeler.model_checker,
-            solve_timer=solve_timer,
-            build_timer=build_timer,
-            cutoff = args.cutoff,
-            #next_func=lambda u,l: u-1,
-            )
+            optimization.lower_bound_steiner,
+            limit_popcount,
+            optimization.soft_popcount)
+    if args.portfolio:
+        result = portfolio.run_portfolio(
+                mrrg,
+                design,
+                configs,
+                init,
+                funcs,
+                optimizer,
+                verbose=verbose,
+                share=args.share_bounds,
+                cutoff = args.cutoff,
+                assumptions = args.assumptions,
+                core_guided = args.core_guided,
+                pins = pnr.pins,
+                )
+        sat = result is not None and result.sat
+    elif args.native:
+        sat = pnr.optimize_native(
+                optimizer,
+                init,
+                funcs,
+                verbose=verbose,
+                attest_func=modeler.model_checker,
+                solve_timer=solve_timer,
+                build_timer=build_timer,
+                )
+    else:
+        if args.log_models is None:
+            log_file = contextlib.nullcontext()
+        else:
+            log_file = open(args.log_models, 'w')
+        with log_file as f:
+            model_log = None if f is None else modeler.ModelLog(f)
+            sat = pnr.optimize_design(
+#            sat = pnr.optimize_enum(
+                    optimizer,
+                    init,
+                    funcs,
+                    verbose=verbose,
+                    attest_func=modeler.model_checker,
+                    solve_timer=solve_timer,
+                    build_timer=build_timer,
+                    cutoff = args.cutoff,
+                    assumptions = args.assumptions,
+                    core_guided = args.core_guided,
+                    model_log = model_log,
+                    #next_func=lambda u,l: u-1,
+                    )
     opt_end = time.perf_counter()
-    if sat:
+    if sat and args.portfolio:
+        portfolio_attest(result, modeler.model_checker)
+        print('SAT')
+        if verbose:
+            portfolio_attest(result, modeler.model_info, modeler.routing_stats)
+    elif sat:
         pnr.attest_design(modeler.model_checker, verbose=verbose)
         print('SAT')
         if verbose:
@@ -108,23 +265,41 @@ if args.optimize:
             except:
                 return formatter(time)
         print(f'Optimization took {time_formater(opt_end - opt_start)} seconds', flush=True)
-        print(f'Constraint building:\n\ttimes: {time_formater(build_timer.times)}\n\ttotal: {time_formater(build_timer.total)}')
-        print(f'Solving:\n\ttimes: {time_formater(solve_timer.times)}\n\ttotal: {time_formater(solve_timer.total)}')
+        if not args.portfolio:
+            # the timers run inside the portfolio workers
+            print(f'Constraint building:\n\ttimes: {time_formater(build_timer.times)}\n\ttotal: {time_formater(build_timer.total)}')
+            print(f'Solving:\n\ttimes: {time_formater(solve_timer.times)}\n\ttotal: {time_formater(solve_timer.total)}')
 else:
     constraint_start = time.perf_counter()
-    pnr.map_design(init, funcs, verbose=verbose)
+    if args.slack is None and not args.portfolio and not args.staged:
+        pnr.map_design(init, funcs, verbose=verbose)
     constraint_end = time.perf_counter()
     if args.time and verbose:
         print(f'Constraint building took {constraint_end - constraint_start} seconds', flush=True)
 
     solver_start = time.perf_counter()
-    sat = pnr.solve(verbose=verbose)
+    if args.portfolio:
+        result = portfolio.run_portfolio(mrrg, design, configs, init, funcs, verbose=verbose, pins=pnr.pins)
+        sat = result is not None and result.sat
+    elif args.staged:
+        # constraints are built per stage so building is included in solving
+        sat = pnr.satisfy_design(init, funcs, verbose=verbose)
+    elif args.slack is None:
+        sat = pnr.solve(verbose=verbose)
+    else:
+        # constraints are built per slack so building is included in solving
+        sat = pnr.solve_windowed((init_placement,), funcs, args.slack, args.max_slack, verbose=verbose)
     solver_end = time.perf_counter()
 
     if args.time and verbose:
         print(f'Solving took {solver_end - solver_start} seconds', flush=True)
 
-    if sat:
+    if sat and args.portfolio:
+        portfolio_attest(result, modeler.model_checker)
+        print('SAT')
+        if verbose:
+            portfolio_attest(result, modeler.model_info, modeler.routing_stats)
+    elif sat:
         pnr.attest_design(modeler.model_checker, verbose=verbose)
         print('SAT')
         if verbose:
@@ -12,6 +12,7 @@ from util import Timer
 import json
 import tester
 import time
+import formula_cache
 
 
 parser = argparse.ArgumentParser('run test')
@@ -20,13 +21,27 @@ parser.add_argument('contexts', help='Number of contexts', type=int)
 parser.add_argument('design', metavar='<DESIGN_FILE>', help='dot file')
 parser.add_argument('optimizer_name')
 parser.add_argument('--cutoff', type=float, default=None)
+parser.add_argument('--solver', default=tester.SOLVER)
+parser.add_argument('--native', action='store_true', default=False, help='single MaxSAT/OMT call instead of binary search')
 parser.add_argument('--optimize_final', action='store_true', default=False)
 parser.add_argument('--incremental', action='store_true', default=False)
+parser.add_argument('--assumptions', action='store_true', default=False, help='guard bounds with assumption literals, requires --incremental')
+parser.add_argument('--core-guided', action='store_true', default=False, dest='core_guided', help='raise the lower bound from unsat cores, requires --incremental')
 parser.add_argument('--duplicate_const', action='store_true', default=False)
 parser.add_argument('--duplicate_all', action='store_true', default=False)
+parser.add_argument('--commute', action='store_true', default=False)
 parser.add_argument('--no-tie-nodes', action='store_true', default=False, dest='ntiesnodes')
+parser.add_argument('--sparse', action='store_true', default=False)
+parser.add_argument('--prune', action='store_true', default=False)
+parser.add_argument('--symmetry', action='store_true', default=False, help='break symmetries of the fabric and the design')
+parser.add_argument('--encoding', default=constraints.DEFAULT_ENCODING, choices=constraints.ENCODINGS)
+parser.add_argument('--encoding-for', action='append', default=[], dest='encoding_for', metavar='GENERATOR=ENCODING')
+parser.add_argument('--formula-cache', default=None, dest='formula_cache', metavar='DIR',
+        help='reuse the built formula from DIR, requires --solver CNF and --incremental')
 
 args = parser.parse_args()
+if args.formula_cache is not None and not (args.incremental or args.native):
+    parser.error('--formula-cache requires --incremental or --native')
 
 solve_timer = Timer(time.perf_counter)
 build_timer = Timer(time.perf_counter)
@@ -42,9 +57,15 @@ optimize_final = args.optimize_final
 incremental = args.incremental
 duplicate_const = args.duplicate_const
 duplicate_all = args.duplicate_all
+commute = args.commute
+sparse = args.sparse
+prune = args.prune
+symmetry = args.symmetry
+encoding = args.encoding
+encoding_for = dict(e.split('=') for e in args.encoding_for)
 
 optimizer = tester.OPTIMIZERS[optimizer_name]
-solver = tester.SOLVER
+solver = args.solver
 
 
 mods, ties = dotparse.dot2graph(design_file)
@@ -52,21 +73,58 @@ design = Design(mods, ties)
 cgra = adlparse(fabric_file)
 mrrg = MRRG(cgra, contexts=contexts, add_tie_nodes=not args.ntiesnodes)
 
-pnr = PNR(mrrg, design, solver, incremental=incremental, duplicate_const=duplicate_const, duplicate_all=duplicate_all)
+pnr = PNR(mrrg, design, solver, incremental=incremental, duplicate_const=duplicate_const, duplicate_all=duplicate_all, commute=commute)
+
+init = tester.make_init(sparse, prune)
+funcs = constraints.set_encodings(tester.funcs, encoding, encoding_for)
+if symmetry:
+    funcs += (constraints.fabric_symmetry, constraints.design_symmetry)
 
 full_timer.start()
-result = pnr.optimize_design(
-        optimizer,
-        tester.init,
-        tester.funcs,
-        verbose=False,
-        cutoff=cutoff,
-        build_timer=build_timer,
-        solve_timer=solve_timer,
-        return_bounds=True,
-        optimize_final=optimize_final,
-#        attest_func=modeler.model_checker,
-        )
+cache_hit = None
+if args.formula_cache is not None:
+    key = formula_cache.cache_key(
+            fabric_file,
+            design_file,
+            (*init, *funcs),
+            contexts=contexts,
+            tie_nodes=not args.ntiesnodes,
+            duplicate_const=duplicate_const,
+            duplicate_all=duplicate_all,
+            commute=commute,
+            sparse=sparse,
+            prune=prune)
+    build_timer.start()
+    cache_hit = pnr.map_design_cached(formula_cache.FormulaCache(args.formula_cache), key, init, funcs)
+    build_timer.stop()
+    # the formula is built, the optimizers only add the objective
+    init = funcs = ()
+
+if args.native:
+    result = pnr.optimize_native(
+            optimizer,
+            init,
+            funcs,
+            verbose=False,
+            build_timer=build_timer,
+            solve_timer=solve_timer,
+            return_bounds=True,
+            )
+else:
+    result = pnr.optimize_design(
+            optimizer,
+            init,
+            funcs,
+            verbose=False,
+            cutoff=cutoff,
+            build_timer=build_timer,
+            solve_timer=solve_timer,
+            return_bounds=True,
+            optimize_final=optimize_final,
+            assumptions=args.assumptions,
+            core_guided=args.core_guided,
+#            attest_func=modeler.model_checker,
+            )
 
 full_timer.stop()
 
@@ -78,12 +136,22 @@ print(json.dumps({
     },
     'params' : {
         'incremental' : incremental,
+        'assumptions' : args.assumptions,
+        'core_guided' : args.core_guided,
         'cutoff' : cutoff,
         'optimize_final' : optimize_final,
         'optimizer' : optimizer_name,
         'duplicate_const' : duplicate_const,
         'duplicate_all' : duplicate_all,
+        'commute' : commute,
+        'sparse' : sparse,
+        'prune' : prune,
+        'symmetry' : symmetry,
+        'encoding' : encoding,
+        'encoding_for' : encoding_for,
         'solver' : solver,
+        'native' : args.native,
+        'formula_cache' : cache_hit,
     },
     'results' : {
         'sat' : result[0],
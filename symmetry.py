@@ -0,0 +1,292 @@
+'''
+    Symmetry detection.  An automorphism of the fabric maps every mapping
+    of a design onto another mapping with the same cost, so only the least
+    placement of every orbit needs to be explored.  The constraints which
+    do so live in constraints.py.
+'''
+import typing as tp
+import itertools as it
+import functools as ft
+from collections import Counter
+
+import mrrg
+from mrrg import MRRG, Node
+from design import Design, Operation, Value
+
+Automorphism = tp.Mapping[Node, Node]
+
+def placement_order(cgra : MRRG, design : Design) -> tp.List[tp.Tuple[mrrg.FunctionalUnit, Operation]]:
+    '''
+        fixed order of the (pe, op) placement keys, every lex-leader
+        constraint must use the same order for them to be compatible
+    '''
+    return sorted(
+            ((pe, op) for op in design.operations for pe in cgra.functional_units),
+            key=lambda k : (k[1].name, k[0].name))
+
+def _signature(node : Node) -> tp.Hashable:
+    ''' what an automorphism must preserve besides the edges '''
+    if isinstance(node, mrrg.FunctionalUnit):
+        return type(node), frozenset(node.ops)
+    elif isinstance(node, mrrg.FU_Port):
+        return type(node), node.operand
+    else:
+        return type(node),
+
+def _grid_transforms(locs : tp.AbstractSet[tp.Tuple[int, int]]) -> tp.Iterator[tp.Callable]:
+    '''
+        reflections, rotations and (cyclic) translations of the bounding
+        box of locs which map locs onto itself, the identity excluded
+    '''
+    x0 = min(x for x, _ in locs)
+    y0 = min(y for _, y in locs)
+    w = max(x for x, _ in locs) - x0 + 1
+    h = max(y for _, y in locs) - y0 + 1
+    flips = (
+        lambda x, y : (x, y),
+        lambda x, y : (w-1-x, y),
+        lambda x, y : (x, h-1-y),
+        lambda x, y : (w-1-x, h-1-y),
+    )
+    if w == h:
+        flips += (
+            lambda x, y : (y, x),
+            lambda x, y : (h-1-y, x),
+            lambda x, y : (y, w-1-x),
+            lambda x, y : (h-1-y, w-1-x),
+        )
+
+    for f, dx, dy in it.product(flips, range(w), range(h)):
+        def t(loc, f=f, dx=dx, dy=dy):
+            x, y = f(loc[0] - x0, loc[1] - y0)
+            return (x + dx) % w + x0, (y + dy) % h + y0
+        if all(t(loc) == loc for loc in locs):
+            continue
+        if {t(loc) for loc in locs} == locs:
+            yield t
+
+def _outputs(node : Node) -> tp.Iterator[Node]:
+    ''' outputs of node looking through tie nodes '''
+    for n in node.outputs.values():
+        if isinstance(n, mrrg.TieNode):
+            yield n.output
+        else:
+            yield n
+
+def _lift(
+        at_site : tp.Mapping[tp.Hashable, Node],
+        ties : tp.Mapping[tp.Tuple[Node, Node], Node],
+        t : tp.Callable) -> tp.Optional[tp.Dict[Node, Node]]:
+    '''
+        the map on nodes induced by the map t on block locations,
+        None if it is not an automorphism
+    '''
+    g = dict()
+    for (kind, (i, loc, name)), n in at_site.items():
+        m = at_site.get((kind, (i, t(loc), name)))
+        if m is None or _signature(m) != _signature(n):
+            return None
+        g[n] = m
+
+    if len(set(g.values())) != len(g):
+        return None
+    for n, m in g.items():
+        if Counter(g[o] for o in _outputs(n)) != Counter(_outputs(m)):
+            return None
+
+    # tie nodes are mapped if the image of their edge also has one
+    for (src, dst), n in ties.items():
+        m = ties.get((g[src], g[dst]))
+        if m is not None:
+            g[n] = m
+    return g
+
+@ft.lru_cache(maxsize=None)
+def fabric_automorphisms(cgra : MRRG) -> tp.Tuple[Automorphism, ...]:
+    '''
+        automorphisms of the routing graph induced by symmetries of the
+        block grid, they preserve the type and ops of every functional unit
+        and the operand of every port.  The identity is not included.
+
+        Tie nodes are placed greedily so they rarely share the symmetry of
+        the grid, they are treated as plain edges.  The automorphisms
+        therefore preserve every cost which does not count tie nodes
+        (e.g. optimization.mux_reg_filter but not route_filter).
+    '''
+    at_site = {(type(n), cgra.site(n)) : n for n in cgra.all_nodes if cgra.site(n) is not None}
+    ties = {(n.input, n.output) : n for n in cgra.all_nodes if cgra.site(n) is None}
+    locs = {loc for _, (_, loc, _) in at_site}
+    if not locs:
+        return ()
+    autos = []
+    for t in _grid_transforms(locs):
+        g = _lift(at_site, ties, t)
+        if g is not None:
+            autos.append(g)
+    return tuple(autos)
+
+def _map_key(key, g : tp.Mapping, kinds : tp.Tuple[type, ...]):
+    ''' image of key under g, None if g does not map one of its parts of kinds '''
+    if isinstance(key, tuple):
+        key = tuple(_map_key(k, g, kinds) for k in key)
+        return None if None in key else key
+    elif isinstance(key, kinds):
+        return g.get(key)
+    return key
+
+def respects_pins(
+        g : tp.Mapping,
+        pins : tp.Mapping[tp.Any, int],
+        kinds : tp.Tuple[type, ...] = (Node,)) -> bool:
+    '''
+        whether g maps every pinned key onto a key pinned to the same value,
+        kinds are the types of objects g acts on
+    '''
+    return all(pins.get(_map_key(key, g, kinds)) == value for key, value in pins.items())
+
+DesignAutomorphism = tp.Mapping[tp.Union[Operation, Value], tp.Union[Operation, Value]]
+
+def _operand(op : Operation, port : int) -> int:
+    ''' the operands of commutative ops are interchangeable '''
+    return -1 if op.commute else port
+
+def _refine(
+        design : Design,
+        left : tp.Mapping[Operation, tp.Hashable],
+        right : tp.Mapping[Operation, tp.Hashable],
+        ) -> tp.Optional[tp.Tuple[tp.Dict[Operation, int], tp.Dict[Operation, int]]]:
+    '''
+        color refinement of two colorings in lock step, an op is split by
+        the colors of its sources and destinations and the operands they
+        are tied to.  None if the colorings stop corresponding.
+    '''
+    def signature(colors, op):
+        ins = tuple(sorted((_operand(op, port), colors[v.src]) for port, v in op.inputs.items()))
+        if op.output is None:
+            outs = ()
+        else:
+            outs = tuple(sorted((_operand(dst, port), colors[dst]) for dst, port in op.output.dsts))
+        return colors[op], ins, outs
+
+    n = None
+    while True:
+        sig_l = {op : signature(left, op) for op in design.operations}
+        sig_r = {op : signature(right, op) for op in design.operations}
+        if Counter(sig_l.values()) != Counter(sig_r.values()):
+            return None
+        ranks = {s : i for i, s in enumerate(sorted(set(sig_l.values())))}
+        left = {op : ranks[s] for op, s in sig_l.items()}
+        right = {op : ranks[s] for op, s in sig_r.items()}
+        if len(ranks) == n:
+            return left, right
+        n = len(ranks)
+
+def _individualize(colors : tp.Mapping[Operation, int], op : Operation) -> tp.Dict[Operation, tp.Tuple[int, bool]]:
+    return {o : (c, o is op) for o, c in colors.items()}
+
+def _cells(colors : tp.Mapping[Operation, int]) -> tp.Dict[int, tp.List[Operation]]:
+    cells = dict()
+    for op in sorted(colors, key=lambda o : o.name):
+        cells.setdefault(colors[op], []).append(op)
+    return cells
+
+def _as_automorphism(
+        design : Design,
+        left : tp.Mapping[Operation, int],
+        right : tp.Mapping[Operation, int],
+        ) -> tp.Optional[DesignAutomorphism]:
+    ''' the map of a discrete pair of colorings, None if it is not an automorphism '''
+    at = {c : op for op, c in right.items()}
+    g = {op : at[c] for op, c in left.items()}
+    for op, op_ in list(g.items()):
+        if (op.output is None) != (op_.output is None):
+            return None
+        if op.output is not None:
+            g[op.output] = op_.output
+    for value in design.values:
+        if Counter((g[dst], _operand(dst, port)) for dst, port in value.dsts) \
+                != Counter((dst, _operand(dst, port)) for dst, port in g[value].dsts):
+            return None
+    return g
+
+def _search(
+        design : Design,
+        left : tp.Mapping[Operation, int],
+        right : tp.Mapping[Operation, int],
+        budget : tp.List[int],
+        ) -> tp.Optional[DesignAutomorphism]:
+    '''
+        individualization-refinement search for an automorphism which maps
+        the left coloring onto the right one, gives up when budget runs out
+    '''
+    budget[0] -= 1
+    if budget[0] < 0:
+        return None
+    refined = _refine(design, left, right)
+    if refined is None:
+        return None
+    left, right = refined
+    cells_l = _cells(left)
+    if all(len(cell) == 1 for cell in cells_l.values()):
+        return _as_automorphism(design, left, right)
+
+    c = min(c for c, cell in cells_l.items() if len(cell) > 1)
+    op = cells_l[c][0]
+    for op_ in _cells(right)[c]:
+        g = _search(design, _individualize(left, op), _individualize(right, op_), budget)
+        if g is not None:
+            return g
+    return None
+
+def _orbit(op : Operation, autos : tp.Sequence[DesignAutomorphism]) -> tp.Set[Operation]:
+    orbit = {op}
+    frontier = [op]
+    while frontier:
+        o = frontier.pop()
+        for g in autos:
+            if g[o] not in orbit:
+                orbit.add(g[o])
+                frontier.append(g[o])
+    return orbit
+
+@ft.lru_cache(maxsize=None)
+def _design_automorphisms(
+        design : Design,
+        duplicates : tp.FrozenSet[Operation],
+        commuting : tp.FrozenSet[Operation],
+        budget : int,
+        ) -> tp.Tuple[DesignAutomorphism, ...]:
+    colors = {op : (op.opcode, op in duplicates, op in commuting) for op in design.operations}
+    refined = _refine(design, colors, colors)
+    colors = refined[0]
+    autos = []
+    # generators of the stabilizer chain, every level fixes one more op
+    while True:
+        cells = _cells(colors)
+        nontrivial = [c for c, cell in cells.items() if len(cell) > 1]
+        if not nontrivial:
+            break
+        op, *others = cells[min(nontrivial)]
+        level = []
+        for op_ in others:
+            if op_ in _orbit(op, level):
+                continue
+            g = _search(design, _individualize(colors, op), _individualize(colors, op_), [budget])
+            if g is not None:
+                level.append(g)
+        autos.extend(level)
+        colors = _refine(design, _individualize(colors, op), _individualize(colors, op))[0]
+    return tuple(autos)
+
+def design_automorphisms(design : Design, budget : int = 1000) -> tp.Tuple[DesignAutomorphism, ...]:
+    '''
+        generators of the automorphisms of the design which preserve
+        opcodes, duplicate and commute flags and the operand every value is
+        tied to, unless the op may commute.
+        They map ops to ops and values to values.  Searches for an
+        automorphism which are not resolved within budget steps are
+        abandoned so the generators may be incomplete.
+    '''
+    duplicates = frozenset(op for op in design.operations if op.duplicate)
+    commuting = frozenset(op for op in design.operations if op.commute)
+    return _design_automorphisms(design, duplicates, commuting, budget)
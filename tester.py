@@ -57,16 +57,37 @@ OPTIMIZERS = {
     'BIT_HACK_MUX' : optimization.Optimizer(optimization.mux_filter,
                         optimization.init_popcount_bithack,
                         optimization.smart_count,
-                        optimization.lower_bound_popcount,
-                        optimization.limit_popcount_total),
+                        optimization.lower_bound_steiner,
+                        optimization.limit_popcount_total,
+                        optimization.soft_popcount),
 
     'BIT_HACK_M/R' : optimization.Optimizer(optimization.mux_reg_filter,
                         optimization.init_popcount_bithack,
                         optimization.smart_count,
-                        optimization.lower_bound_popcount,
-                        optimization.limit_popcount_total),
+                        optimization.lower_bound_steiner,
+                        optimization.limit_popcount_total,
+                        optimization.soft_popcount),
+
+    'UNARY_MUX' : optimization.Optimizer(optimization.mux_filter,
+                        optimization.init_popcount_unary,
+                        optimization.smart_count,
+                        optimization.lower_bound_steiner,
+                        optimization.limit_popcount_unary,
+                        optimization.soft_popcount),
+
+    'UNARY_M/R' : optimization.Optimizer(optimization.mux_reg_filter,
+                        optimization.init_popcount_unary,
+                        optimization.smart_count,
+                        optimization.lower_bound_steiner,
+                        optimization.limit_popcount_unary,
+                        optimization.soft_popcount),
 }
 
+# one-hot encodings to benchmark, see constraints.ENCODINGS
+ENCODINGS = [
+    'bv',
+]
+
 CONFIG_MATS = [
     {
         'incremental' : [False],
@@ -94,6 +115,21 @@ init  = (
         constraints.init_routing_vars,
 )
 
+def make_init(sparse : bool = False, prune : bool = False):
+    '''
+        routing windows with slack are not offered, the optimizers would
+        take unsat probes in the restricted space as bounds
+    '''
+    if prune:
+        init_routing = constraints.init_routing_vars_pruned
+    else:
+        init_routing = constraints.init_routing_vars
+
+    return (
+        constraints.init_placement_vars_sparse if sparse else constraints.init_placement_vars,
+        init_routing,
+    )
+
 funcs = (
         constraints.op_placement,
         constraints.pe_exclusivity,
@@ -116,15 +152,17 @@ if __name__ == '__main__':
                         for cutoff in config_mat['cutoff']:
                             for optimize_final in config_mat['optimize_final']:
                                 for dupe in config_mat['duplicate']:
-                                    s = f'PYTHONHASHSEED=0 python3 -W ignore run_test.py {fabric_file} {contexts} {design_file} {optimizer_name}'
-                                    if cutoff is not None:
-                                        s += f' --cutoff {cutoff}'
-                                    if optimize_final:
-                                        s += ' --optimize_final'
-                                    if incremental:
-                                        s += ' --incremental'
-                                    if dupe is not None:
-                                        s += f' --{dupe}'
-
-                                    print(s)
+                                    for encoding in ENCODINGS:
+                                        s = f'PYTHONHASHSEED=0 python3 -W ignore run_test.py {fabric_file} {contexts} {design_file} {optimizer_name}'
+                                        if cutoff is not None:
+                                            s += f' --cutoff {cutoff}'
+                                        if optimize_final:
+                                            s += ' --optimize_final'
+                                        if incremental:
+                                            s += ' --incremental'
+                                        if dupe is not None:
+                                            s += f' --{dupe}'
+                                        s += f' --encoding {encoding}'
+
+                                        print(s)
 